@@ -0,0 +1,120 @@
+"""
+Incremental aggregation store for the TEDS-D aggregates.
+
+The store keeps the mergeable partial statistics produced by teds_pipeline.py
+(counts, sums and rate numerators/denominators) in long form, one row per
+(STFIPS, DISYR, dimension, key). Ingesting a newly published discharge year
+only aggregates that year's raw file, replaces its rows in the store and
+re-derives the Datasets/ tables (including the age distribution) from the
+store, so the cost grows with the new year rather than with the history.
+The tables are rewritten from the store alone, so ingesting refuses to start
+without one (teds_pipeline.py writes it) unless --init is given.
+
+    python agg_store.py tedsd_puf_2020.csv [--out Datasets]
+    python agg_store.py tedsd_puf_2009.csv ... --init   # start a new store
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_store
+import teds_pipeline
+
+
+STORE_FILE = 'agg_store.csv'
+STORE_COLUMNS = ['STFIPS', 'DISYR', 'dimension', 'key', 'value']
+DIMENSIONS = ('totals', 'race', 'gender', 'age')
+
+
+def partial_to_long(partial):
+    frames = []
+    for dim in DIMENSIONS:
+        stats = partial[dim]
+        if dim == 'totals':
+            stats = stats.stack()
+        stats = stats.rename('value').reset_index()
+        stats.columns = ['STFIPS', 'DISYR', 'key', 'value']
+        stats.insert(2, 'dimension', dim)
+        stats['key'] = stats['key'].astype(str)
+        frames.append(stats)
+    return pd.concat(frames, ignore_index=True)[STORE_COLUMNS]
+
+
+def long_to_partial(store):
+    partial = {}
+    for dim in DIMENSIONS:
+        rows = store[store['dimension'] == dim]
+        if dim == 'totals':
+            partial[dim] = (rows.pivot_table(index=teds_pipeline.KEY, columns='key', values='value',
+                                             aggfunc='sum', fill_value=0)
+                            .rename_axis(None, axis=1).astype(np.int64))
+        else:
+            counts = rows.assign(code=rows['key'].astype(np.int64)).set_index(teds_pipeline.KEY + ['code'])['value']
+            partial[dim] = counts.astype(np.int64)
+    return partial
+
+
+def store_path(out_dir=data_store.DATA_DIR):
+    return os.path.join(out_dir, STORE_FILE)
+
+
+def load_store(path):
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=STORE_COLUMNS)
+    return pd.read_csv(path, dtype={'STFIPS': 'int32', 'DISYR': 'int32', 'dimension': 'category',
+                                    'key': 'object', 'value': 'int64'})
+
+
+def save_store(store, path):
+    store = store.sort_values(['DISYR', 'STFIPS', 'dimension', 'key'])
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + '.tmp'
+    store.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def merge_year(store, partial):
+    """Replace every (state, year) cell covered by `partial` with its new statistics."""
+    new = partial_to_long(partial)
+    years = set(new['DISYR'].unique())
+    kept = store[~store['DISYR'].isin(years)]
+    return pd.concat([kept, new], ignore_index=True)[STORE_COLUMNS]
+
+
+def ingest(paths, out_dir=data_store.DATA_DIR, jobs=None, chunksize=500000, init=False):
+    """
+    Fold new raw discharge files into the store and refresh the derived
+    tables. Without an existing store the tables would only cover `paths`,
+    so that needs `init`.
+    """
+    path = store_path(out_dir)
+    if not init and not os.path.exists(path):
+        raise FileNotFoundError('no aggregation store at %s; rebuild it with teds_pipeline.py or pass init=True '
+                                'to start one from these files only' % path)
+    partial = teds_pipeline.aggregate_files(paths, jobs, chunksize)
+    store = merge_year(load_store(path), partial)
+    save_store(store, path)
+    teds_pipeline.write_tables(teds_pipeline.build_tables(long_to_partial(store)), out_dir)
+    ## refresh the columnar copies next to the tables that were just written
+    if os.path.isdir(os.path.join(out_dir, 'columnar')) and data_store.pa is not None:
+        import build_columnar
+        build_columnar.build(data_dir=out_dir)
+    return store
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='raw TEDS-D discharge CSVs for the new year(s)')
+    parser.add_argument('--out', default=data_store.DATA_DIR)
+    parser.add_argument('--jobs', type=int, default=None)
+    parser.add_argument('--chunksize', type=int, default=500000)
+    parser.add_argument('--init', action='store_true',
+                        help='start a new store when OUT has none (the tables then only cover PATHS)')
+    args = parser.parse_args()
+    if not args.init and not os.path.exists(store_path(args.out)):
+        parser.error('%s does not exist; rebuild it with teds_pipeline.py, or pass --init to start a store '
+                     'from these files only' % store_path(args.out))
+    store = ingest(args.paths, args.out, args.jobs, args.chunksize, init=args.init)
+    print('store now covers %s' % ', '.join(str(y) for y in sorted(store['DISYR'].unique())))
@@ -0,0 +1,389 @@
+"""
+Benchmarks for the app and the estimators it shows, written to a JSON file
+that later runs are compared against.
+
+    python benchmarks.py                                   # app + models -> benchmark_results.json
+    python benchmarks.py app --repeat 5
+    python benchmarks.py models --sizes 100000 1000000
+    python benchmarks.py compare baseline.json benchmark_results.json
+
+Every measurement runs in a forked child, so peak RSS is per measurement and
+an estimator that runs out of memory (see --mem-limit-mb) or time is recorded
+as failed instead of ending the run. The app is run in streamlit's bare mode,
+without a server: cap_app.py itself for the overview, and sections.render()
+(what cap_app.py calls) for every section, each in a fresh process with empty
+figure and image caches, followed by --repeat warm renders. The estimators
+are fit on synthetic panels laid out like the 1M regression set: rows are
+spread over state-years like imp_yr_agg_1m and every covariate is a small
+integer code.
+
+Linux only (fork, ru_maxrss in KiB).
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import data_store
+import panel_models
+import teds_pipeline
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+SIZES = (100000, 1000000, 7000000)
+OUT_FILE = 'benchmark_results.json'
+
+## metrics compared by `compare` (larger is worse for all of them) and the
+## smallest increase that counts as a regression, to ignore timer noise
+COMPARED = {'seconds': 0.005, 'first_render_ms': 5.0, 'import_ms': 5.0, 'warm_render_ms': 5.0,
+            'peak_extra_mb': 5.0, 'payload_bytes': 1024}
+
+
+def _rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1048576.0
+
+
+def isolated(fn, args=(), timeout=None, mem_limit_mb=None):
+    """
+    fn(*args) -> dict in a forked child, plus its starting and peak RSS in MB.
+    Failures (exceptions, MemoryError under the address-space limit, timeouts,
+    kills) come back as {'error': ...}.
+    """
+    ctx = multiprocessing.get_context('fork')
+    receiver, sender = ctx.Pipe(duplex=False)
+
+    def target():
+        if mem_limit_mb:
+            limit = int(mem_limit_mb * 1048576)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        start = _rss_mb()
+        try:
+            result = fn(*args)
+        except (Exception, MemoryError) as e:
+            result = {'error': '%s: %s' % (type(e).__name__, e)}
+        result['rss_start_mb'] = start
+        result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+        result['peak_extra_mb'] = result['peak_rss_mb'] - start
+        sender.send(result)
+
+    proc = ctx.Process(target=target)
+    proc.start()
+    sender.close()
+    if receiver.poll(timeout):
+        try:
+            result = receiver.recv()
+        except EOFError:
+            result = None
+    else:
+        proc.terminate()
+        result = {'error': 'timed out after %s s' % timeout}
+    proc.join()
+    if result is None:
+        result = {'error': 'child exited with code %s' % proc.exitcode}
+    return result
+
+
+## -- app -------------------------------------------------------------------
+
+def _cold_process():
+    ## empty figure and image caches, so every child measures a cold start
+    import image_assets
+    import streamlit.logger
+    os.environ['TEDS_FIGURE_CACHE'] = tempfile.mkdtemp(prefix='teds_bench_fig_')
+    image_assets.VARIANT_DIR = tempfile.mkdtemp(prefix='teds_bench_img_')
+    ## bare mode warns about the missing server on every call
+    streamlit.logger.set_log_level('ERROR')
+
+
+def _payload(figures):
+    import plotly.io as pio
+    sizes = [len(pio.to_json(fig, validate=False)) for fig in figures]
+    return {'figures': len(sizes), 'payload_bytes': sum(sizes), 'largest_payload_bytes': max(sizes or [0])}
+
+
+def _bench_overview(repeat):
+    import runpy
+    _cold_process()
+    times = []
+    for _ in range(repeat + 1):
+        t0 = time.perf_counter()
+        runpy.run_path(os.path.join(REPO_DIR, 'cap_app.py'), run_name='__main__')
+        times.append((time.perf_counter() - t0) * 1e3)
+    result = {'first_render_ms': times[0], 'warm_render_ms': statistics.median(times[1:]) if repeat else None}
+    result.update(_payload([]))
+    return result
+
+
+def _bench_section(name, repeat):
+    _cold_process()
+    import sections
+    import sections.shared as shared
+
+    figures = []
+    show = shared.plotly_chart
+
+    def plotly_chart(fig):
+        figures.append(fig)
+        show(fig)
+
+    ## the section modules are not imported yet, so they pick up the wrapper
+    shared.plotly_chart = plotly_chart
+    record = sections.render(name)
+    cold = list(figures)
+    warm = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        sections.render(name)
+        warm.append((time.perf_counter() - t0) * 1e3)
+    result = {'import_ms': record['import_ms'], 'first_render_ms': record['first_render_ms'],
+              'warm_render_ms': statistics.median(warm) if warm else None}
+    result.update(_payload(cold))
+    return result
+
+
+def bench_app(repeat=3, timeout=None, mem_limit_mb=None):
+    import sections
+    results = OrderedDict()
+    results['Overview'] = isolated(_bench_overview, (repeat,), timeout, mem_limit_mb)
+    for name in sections.SECTIONS:
+        results[name] = isolated(_bench_section, (name, repeat), timeout, mem_limit_mb)
+    return results
+
+
+## -- estimators ------------------------------------------------------------
+
+def synthetic_raw(nrows, seed=0, missing=0.0):
+    """
+    Raw TEDS-D-shaped codes: state-years drawn in proportion to
+    imp_yr_agg_1m, integer-coded covariates and REASON. With `missing`, about
+    that share of every covariate is set to -9, more often in some states.
+    """
+    rng = np.random.default_rng(seed)
+    fips_of = dict((label, fips) for fips, label in teds_pipeline.STATE_LABELS.items())
+    cells = data_store.load_dataset('imp_yr_agg_1m')
+    cells = cells[cells['STATE_NAME'].astype(str).isin(fips_of)]
+    pick = rng.choice(len(cells), size=nrows, p=cells['count'].to_numpy() / cells['count'].sum())
+    state = cells['STATE_NAME'].astype(str).map(fips_of).to_numpy()[pick].astype('int8')
+    year = cells['DISYR'].to_numpy()[pick].astype('int16')
+    df = pd.DataFrame({'STFIPS': state, 'DISYR': year})
+
+    codes = {'AGE': (2, 12), 'GENDER': (1, 2), 'VET': (1, 2), 'RACE': (1, 9), 'EMPLOY': (1, 4), 'EDUC': (1, 5),
+             'LIVARAG': (1, 3), 'METHUSE': (1, 2), 'NOPRIOR': (0, 5), 'SUB1': (1, 19), 'PRIMPAY': (1, 5),
+             'PSYPROB': (1, 2)}
+    for col, (lo, hi) in codes.items():
+        df[col] = rng.integers(lo, hi + 1, size=nrows, dtype=np.int8)
+
+    state_effect = rng.normal(0, 0.05, size=128)[state]
+    treat = panel_models.derive_columns(df.assign(REASON=np.int8(1)))['Treat']
+    p = (0.55 + state_effect + 0.001 * (year - 2009) + 0.015 * treat - 0.2 * (df['METHUSE'] == 1)
+         + 0.01 * df['EDUC'] - 0.03 * (df['LIVARAG'] == 1))
+    ## REASON 1 is a completed treatment, the other codes are other discharge reasons
+    df['REASON'] = np.where(rng.random(nrows) < np.clip(p, 0, 1), 1, rng.integers(2, 8, size=nrows)).astype('int8')
+
+    if missing:
+        state_rate = missing * rng.uniform(0.2, 1.8, size=128)[state]
+        for col in teds_pipeline.REGRESSION_COLUMNS:
+            df.loc[rng.random(nrows) < state_rate, col] = teds_pipeline.MISSING
+    return df
+
+
+def synthetic_panel(nrows, seed=0):
+    """synthetic_raw() turned into the regression set's columns."""
+    return panel_models.derive_columns(synthetic_raw(nrows, seed))
+
+
+def app_formula(covariates, effects=False):
+    """The ols() formula strings shown in the Models and Results section."""
+    rhs = ' + '.join(covariates)
+    if effects:
+        rhs += ' + C(DISYR) + C(STFIPS)'
+    return '%s ~ %s' % (panel_models.OUTCOME, rhs)
+
+
+def _dd_ols(df):
+    from statsmodels.formula.api import ols
+    return ols(app_formula(panel_models.DD_V), data=df).fit()
+
+
+def _fe_ols(df):
+    from statsmodels.formula.api import ols
+    return ols(app_formula(panel_models.FE_V, effects=True), data=df).fit()
+
+
+def _panelols_data(df):
+    from wild_bootstrap import PANELOLS
+    w1 = df.set_index(['STFIPS', 'DISYR'])
+    return w1[panel_models.OUTCOME], w1[PANELOLS]
+
+
+def _panelols(data):
+    from linearmodels import PanelOLS
+    y, X = data
+    return PanelOLS(y, X, entity_effects=True, time_effects=True).fit(
+        cov_type='clustered', cluster_entity=True, cluster_time=True)
+
+
+def _cube(df):
+    import suff_cube
+    return suff_cube.SuffCube.from_frame(df)
+
+
+## name -> (prepare(df) untimed, fit(prepared) timed)
+ESTIMATORS = OrderedDict([
+    ('dd_v ols', (None, _dd_ols)),
+    ('FE_v ols C(DISYR) + C(STFIPS)', (None, _fe_ols)),
+    ('PanelOLS clustered', (_panelols_data, _panelols)),
+    ('FE_v within (panel_models)', (None, panel_models.fit_twfe)),
+    ('suff cube build', (None, _cube)),
+    ('FE_v clustered from cube', (_cube, lambda cube: cube.fit(panel_models.FE_V, effects=True, cluster=True))),
+    ('dd_v from cube', (_cube, lambda cube: cube.fit(panel_models.DD_V))),
+])
+
+
+def _bench_estimator(df, name, repeat):
+    prepare, fit = ESTIMATORS[name]
+    data = prepare(df) if prepare else df
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fit(data)
+        times.append(time.perf_counter() - t0)
+    return {'seconds': min(times), 'runs': times}
+
+
+def bench_models(sizes=SIZES, estimators=None, repeat=1, seed=0, timeout=None, mem_limit_mb=None):
+    results = OrderedDict()
+    for nrows in sizes:
+        t0 = time.perf_counter()
+        df = synthetic_panel(nrows, seed)
+        print('%d rows generated in %.1f s' % (nrows, time.perf_counter() - t0), file=sys.stderr)
+        results[str(nrows)] = OrderedDict()
+        for name in estimators or ESTIMATORS:
+            result = isolated(_bench_estimator, (df, name, repeat), timeout, mem_limit_mb)
+            results[str(nrows)][name] = result
+            print('  %-32s %s' % (name, result.get('error') or '%.3f s, peak %.0f MB' % (
+                result['seconds'], result['peak_rss_mb'])), file=sys.stderr)
+        del df
+    return results
+
+
+## -- baseline file ----------------------------------------------------------
+
+def _versions():
+    versions = OrderedDict()
+    for module in ('numpy', 'pandas', 'scipy', 'plotly', 'streamlit', 'statsmodels', 'linearmodels', 'pyhdfe', 'pyarrow'):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    return versions
+
+
+def _git_revision():
+    import subprocess
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata():
+    return OrderedDict([
+        ('timestamp', datetime.datetime.now().isoformat(timespec='seconds')),
+        ('git_revision', _git_revision()),
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('cpus', os.cpu_count()),
+        ('memory_mb', os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1048576.0),
+        ('versions', _versions()),
+    ])
+
+
+def _leaves(tree, prefix=()):
+    for key, value in tree.items():
+        if isinstance(value, dict):
+            for item in _leaves(value, prefix + (key,)):
+                yield item
+        elif key in COMPARED and isinstance(value, (int, float)):
+            yield prefix + (key,), value
+
+
+def compare(old, new, tolerance=0.2):
+    """
+    (metric, old, new, ratio, regressed) for every metric in both runs; a
+    metric regressed when it grew by more than `tolerance` and its floor.
+    """
+    before = dict(_leaves(dict((k, v) for k, v in old.items() if k != 'meta')))
+    rows = []
+    for path, value in _leaves(dict((k, v) for k, v in new.items() if k != 'meta')):
+        if path not in before:
+            continue
+        base = before[path]
+        ratio = value / base if base else float('inf') if value else 1.0
+        regressed = ratio > 1 + tolerance and value - base > COMPARED[path[-1]]
+        rows.append((' / '.join(path), base, value, ratio, regressed))
+    return rows
+
+
+def _print_comparison(rows):
+    for metric, before, after, ratio, regressed in rows:
+        print('%-80s %12.3f %12.3f %7.2fx%s' % (metric, before, after, ratio, '  REGRESSION' if regressed else ''))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('what', nargs='?', choices=('all', 'app', 'models', 'compare'), default='all')
+    parser.add_argument('files', nargs='*', help='baseline and new result files for compare')
+    parser.add_argument('--out', default=OUT_FILE)
+    parser.add_argument('--repeat', type=int, default=3, help='warm renders per app section')
+    parser.add_argument('--fits', type=int, default=1, help='fits per estimator and size (the fastest is kept)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--estimators', nargs='+', choices=list(ESTIMATORS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=3600, help='seconds per measurement')
+    parser.add_argument('--mem-limit-mb', type=float,
+                        default=os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1048576.0,
+                        help='address-space limit per measurement (default: physical memory; 0 for none)')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='compare: allowed slowdown ratio - 1')
+    args = parser.parse_args()
+
+    if args.what == 'compare':
+        if len(args.files) != 2:
+            parser.error('compare needs a baseline file and a result file')
+        with open(args.files[0]) as f:
+            old = json.load(f)
+        with open(args.files[1]) as f:
+            new = json.load(f)
+        rows = compare(old, new, args.tolerance)
+        _print_comparison(rows)
+        sys.exit(1 if any(row[-1] for row in rows) else 0)
+
+    os.chdir(REPO_DIR)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    report = OrderedDict([('meta', metadata())])
+    report['meta']['settings'] = dict(repeat=args.repeat, fits=args.fits, seed=args.seed, mem_limit_mb=args.mem_limit_mb)
+    if args.what in ('all', 'app'):
+        report['app'] = bench_app(args.repeat, args.timeout, args.mem_limit_mb or None)
+        for name, result in report['app'].items():
+            print('%-28s %s' % (name, result.get('error') or 'first render %.0f ms, warm %s ms, peak %.0f MB, %d figures %.0f KB' % (
+                result['first_render_ms'], '%.0f' % result['warm_render_ms'] if result['warm_render_ms'] is not None else '-',
+                result['peak_rss_mb'], result['figures'], result['payload_bytes'] / 1024.0)), file=sys.stderr)
+    if args.what in ('all', 'models'):
+        report['models'] = bench_models(args.sizes, args.estimators, args.fits, args.seed, args.timeout,
+                                        args.mem_limit_mb or None)
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('wrote %s' % args.out, file=sys.stderr)
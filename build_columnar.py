@@ -0,0 +1,78 @@
+"""
+Converts every aggregate in Datasets/ to typed, dictionary-encoded Feather and
+Parquet files under Datasets/columnar/, which data_store.py memory-maps instead
+of parsing the CSVs.
+
+    python build_columnar.py            # (re)build the columnar copies
+    python build_columnar.py --compare  # CSV vs Feather vs Parquet load time/memory
+"""
+import argparse
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+import data_store
+
+
+def build(names=None, data_dir=data_store.DATA_DIR):
+    """Columnar copies of the CSVs in `data_dir`, written to its columnar/ subdirectory."""
+    os.makedirs(os.path.join(data_dir, 'columnar'), exist_ok=True)
+    for name in names or sorted(data_store.SCHEMAS):
+        df = data_store.read_csv(name, data_dir)
+        digest = data_store.file_digest(data_store.dataset_path(name, data_dir))
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        meta = dict(table.schema.metadata or {})
+        meta[data_store.SOURCE_DIGEST_KEY] = digest.encode()
+        table = table.replace_schema_metadata(meta)
+        ## uncompressed so the file can be memory-mapped without a decode step
+        feather.write_feather(table, data_store.columnar_path(name, 'feather', data_dir), compression='uncompressed')
+        pq.write_table(table, data_store.columnar_path(name, 'parquet', data_dir), use_dictionary=True, compression='snappy')
+        print('%-14s %6d rows  -> feather, parquet' % (name, table.num_rows))
+
+
+def _measure(fn, repeat):
+    import psutil
+    proc = psutil.Process()
+    best = float('inf')
+    for _ in range(repeat):
+        rss0 = proc.memory_info().rss
+        t0 = time.perf_counter()
+        df = fn()
+        best = min(best, time.perf_counter() - t0)
+    rss = proc.memory_info().rss - rss0
+    return best, int(df.memory_usage(deep=True).sum()), rss
+
+
+def compare(repeat=5):
+    loaders = (
+        ('csv (raw)', lambda name: pd.read_csv(data_store.dataset_path(name))),
+        ('csv (typed)', data_store.read_csv),
+        ('feather mmap', lambda name: data_store._read_arrow(name, None)),
+        ('parquet', lambda name: pq.read_table(data_store.columnar_path(name, 'parquet'), memory_map=True).to_pandas()),
+    )
+    print('%-14s %-13s %10s %12s %12s' % ('dataset', 'loader', 'best ms', 'frame KiB', 'rss delta KiB'))
+    totals = dict((label, [0.0, 0]) for label, _ in loaders)
+    for name in sorted(data_store.SCHEMAS):
+        for label, fn in loaders:
+            secs, nbytes, rss = _measure(lambda: fn(name), repeat)
+            totals[label][0] += secs
+            totals[label][1] += nbytes
+            print('%-14s %-13s %10.2f %12.1f %12.1f' % (name, label, secs * 1e3, nbytes / 1024.0, rss / 1024.0))
+    print()
+    for label, (secs, nbytes) in totals.items():
+        print('%-28s %10.2f %12.1f' % ('total ' + label, secs * 1e3, nbytes / 1024.0))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('names', nargs='*', help='datasets to convert (default: all)')
+    parser.add_argument('--compare', action='store_true', help='benchmark the loaders after building')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    build(args.names)
+    if args.compare:
+        compare(args.repeat)
@@ -0,0 +1,89 @@
+"""
+Figure builders for the EDA section.
+
+The box plots are summarized server side: quartiles, fences and notches are
+computed per x value with NumPy and handed to go.Box as precomputed
+statistics, and only the outliers are sent as points. The payload then grows
+with the number of boxes, not with the number of rows behind them.
+"""
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+
+def _median(v):
+    n = len(v)
+    mid = n // 2
+    return v[mid] if n % 2 else 0.5 * (v[mid - 1] + v[mid])
+
+
+def quartiles(v, method='linear'):
+    """q1, median, q3 of sorted `v`, using plotly's quartilemethod definitions."""
+    n = len(v)
+    if method == 'linear' or n < 2:
+        return tuple(np.quantile(v, [0.25, 0.5, 0.75]))
+    half = n // 2
+    if method == 'exclusive':
+        lower, upper = v[:half], v[n - half:]
+    elif method == 'inclusive':
+        lower, upper = v[:n - half], v[half:]
+    else:
+        raise ValueError('unknown quartile method %r' % method)
+    return _median(lower), _median(v), _median(upper)
+
+
+def box_stats(df, x, y, quartilemethod='linear'):
+    """One row per x value with q1/median/q3, fences, notch span and the outlier mask."""
+    data = df[[x, y]].dropna().sort_values([x, y], kind='mergesort')
+    xs = data[x].to_numpy()
+    ys = data[y].to_numpy(dtype=float)
+    keys, starts = np.unique(xs, return_index=True)
+    bounds = np.append(starts, len(xs))
+    rows = []
+    outlier = np.zeros(len(ys), dtype=bool)
+    for key, lo, hi in zip(keys, bounds[:-1], bounds[1:]):
+        v = ys[lo:hi]
+        q1, med, q3 = quartiles(v, quartilemethod)
+        iqr = q3 - q1
+        inside = (v >= q1 - 1.5 * iqr) & (v <= q3 + 1.5 * iqr)
+        outlier[lo:hi] = ~inside
+        rows.append((key, q1, med, q3, v[inside].min(), v[inside].max(), 1.57 * iqr / np.sqrt(len(v)),
+                     v.mean(), len(v)))
+    stats = pd.DataFrame(rows, columns=[x, 'q1', 'median', 'q3', 'lowerfence', 'upperfence', 'notchspan', 'mean', 'n'])
+    return stats, data.index[outlier]
+
+
+def box_figure(df, x, y, title, color, hover=None, quartilemethod='exclusive', notched=True):
+    """Equivalent of px.box(df, x, y, notched, hover_data=[hover]) built from precomputed statistics."""
+    stats, outliers = box_stats(df, x, y, quartilemethod)
+    fig = go.Figure(go.Box(
+        x=stats[x], q1=stats['q1'], median=stats['median'], q3=stats['q3'],
+        lowerfence=stats['lowerfence'], upperfence=stats['upperfence'],
+        notched=notched, notchspan=stats['notchspan'] if notched else None,
+        marker_color=color, boxpoints=False, name=y, showlegend=False))
+    points = df.loc[outliers]
+    if len(points):
+        customdata = points[[hover]].astype(str) if hover else None
+        fig.add_trace(go.Scatter(
+            x=points[x], y=points[y], mode='markers', marker_color=color, showlegend=False, name='outliers',
+            customdata=customdata,
+            hovertemplate=('%s=%%{customdata[0]}<br>' % hover if hover else '') + '%s=%%{x}<br>%s=%%{y}<extra></extra>' % (x, y)))
+    fig.update_layout(title_text='<b>%s</b>' % title, title_x=0.5, xaxis_title=x, yaxis_title=y)
+    fig.update_xaxes(nticks=15)
+    return fig
+
+
+def age_donut(age_dist, colors=('blue', 'red', 'lightblue', 'orange')):
+    return go.Figure(data=go.Pie(values=age_dist['count'].tolist(), labels=age_dist['AGE_GRP'].tolist(), hole=0.4,
+                                 title='<b> Age Distribution </b>', marker_colors=list(colors)))
+
+
+def count_histogram(df, x, color, title, barmode='group', width=None, height=None):
+    """px.histogram of the 'count' column by `x`, with `x` as a categorical axis."""
+    import plotly.express as px
+    fig = px.histogram(df, x=x, y='count', barmode=barmode, color=color, title='<b>%s</b>' % title)
+    fig.update_xaxes(type='category')
+    fig.update_layout(yaxis_title='Count')
+    if width or height:
+        fig.update_layout(width=width, height=height)
+    return fig
@@ -0,0 +1,200 @@
+"""
+Process-wide loader for the aggregate tables in Datasets/.
+
+Streamlit reruns cap_app.py on every interaction but only imports this module
+once per process, so every session shares the same parsed frames. Each entry is
+revalidated against the file's mtime (and content hash when the mtime moves) and
+the least recently used frames are evicted once the memory budget is exceeded.
+The returned frames are shared: treat them as read-only.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import metrics
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Datasets')
+
+## Feather/Parquet copies written by build_columnar.py
+COLUMNAR_DIR = os.path.join(DATA_DIR, 'columnar')
+SOURCE_DIGEST_KEY = b'source_sha1'
+
+## memory budget for cached frames, in MB (override with TEDS_CACHE_MB)
+CACHE_BUDGET_MB = float(os.environ.get('TEDS_CACHE_MB', 256))
+
+## name -> (file, {column: dtype}); only the listed columns are read
+SCHEMAS = {
+    'dis_rate': ('dis_rate_agg.csv', {'state': 'category', 'year': 'int16', 'tmp_rate': 'float32'}),
+    'ptype_rate': ('ptype_rate.csv', {'state': 'category', 'year': 'int16', 'medicaid_use': 'float32'}),
+    'prior_rate': ('prior_rate.csv', {'state': 'category', 'year': 'int16', 'discharge_rate': 'float32'}),
+    'homeless_rate': ('homeless_rate.csv', {'state': 'category', 'year': 'int16', 'homeless_rate': 'float32'}),
+    'race_agg': ('race_agg2.csv', {'STATE_NAME': 'category', 'DISYR': 'int16', 'Race_Categ': 'category', 'count': 'int32'}),
+    'gender_agg': ('gender_agg.csv', {'STATE_NAME': 'category', 'DISYR': 'int16', 'Gender_Type': 'category', 'count': 'int32'}),
+    'imp_yr_agg': ('imp_yr_agg.csv', {'DISYR': 'int16', 'STATE_NAME': 'category', 'Imp_Year': 'category', 'count': 'int32'}),
+    'imp_yr_agg_1m': ('imp_yr_agg_1m.csv', {'DISYR': 'int16', 'STATE_NAME': 'category', 'Imp_Year': 'category', 'count': 'int32'}),
+    'age_dist': ('age_dist.csv', {'AGE_GRP': 'object', 'count': 'int64'}),
+}
+
+
+class _Entry(object):
+    __slots__ = ('frame', 'mtime_ns', 'size', 'digest', 'nbytes')
+
+    def __init__(self, frame, mtime_ns, size, digest):
+        self.frame = frame
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.digest = digest
+        self.nbytes = int(frame.memory_usage(deep=True).sum())
+
+
+_cache = OrderedDict()
+_lock = threading.RLock()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+## path -> ((mtime_ns, size), SHA-1)
+_digests = {}
+
+
+def dataset_path(name, data_dir=DATA_DIR):
+    return os.path.join(data_dir, SCHEMAS[name][0])
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cached_file_digest(path):
+    """file_digest(path), recomputed only when the file's mtime or size changes."""
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        cached = _digests.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    digest = file_digest(path)
+    with _lock:
+        _digests[path] = (stamp, digest)
+    return digest
+
+
+def columnar_path(name, ext='feather', data_dir=DATA_DIR):
+    return os.path.join(data_dir, 'columnar', '%s.%s' % (name, ext))
+
+
+def _read_arrow(name, digest):
+    ## Memory-map the Feather file (falling back to Parquet) and only trust a
+    ## copy that was built from the CSV that is on disk now.
+    if pa is None:
+        return None
+    for ext in ('feather', 'parquet'):
+        path = columnar_path(name, ext)
+        if not os.path.exists(path):
+            continue
+        if ext == 'feather':
+            with pa.memory_map(path, 'r') as source:
+                table = pa.ipc.open_file(source).read_all()
+        else:
+            table = pq.read_table(path, memory_map=True)
+        meta = table.schema.metadata or {}
+        if digest is None or meta.get(SOURCE_DIGEST_KEY) == digest.encode():
+            return table.to_pandas(split_blocks=True)
+    return None
+
+
+def read_dataset(name, digest=None, prefer_columnar=True):
+    """Load one dataset from disk with its declared dtypes (no caching).
+
+    Uses the columnar copy when it matches `digest` (the CSV's SHA-1), and
+    parses the CSV otherwise.
+    """
+    if prefer_columnar:
+        df = _read_arrow(name, digest)
+        if df is not None:
+            return df
+    return read_csv(name)
+
+
+def read_csv(name, data_dir=DATA_DIR):
+    filename, schema = SCHEMAS[name]
+    categorical = dict((col, 'category') for col, dtype in schema.items() if dtype == 'category')
+    df = pd.read_csv(os.path.join(data_dir, filename), usecols=list(schema), dtype=categorical)
+    ## numeric columns are stored as text like "2009.0", so cast after parsing
+    return df[list(schema)].astype(schema)
+
+
+def _evict(keep):
+    budget = CACHE_BUDGET_MB * 1024 * 1024
+    total = sum(e.nbytes for e in _cache.values())
+    for name in list(_cache):
+        if total <= budget:
+            break
+        if name == keep:
+            continue
+        total -= _cache.pop(name).nbytes
+        _stats['evictions'] += 1
+
+
+def load_dataset(name):
+    """Return the cached frame for `name`, reloading it if the file changed."""
+    return _load_entry(name).frame
+
+
+def dataset_digest(name):
+    """SHA-1 of the CSV behind the frame load_dataset(name) returns, without loading it."""
+    return cached_file_digest(dataset_path(name))
+
+
+def _load_entry(name):
+    path = dataset_path(name)
+    st = os.stat(path)
+    with _lock:
+        entry = _cache.get(name)
+        if entry is not None:
+            if (entry.mtime_ns, entry.size) != (st.st_mtime_ns, st.st_size):
+                digest = cached_file_digest(path)
+                if digest != entry.digest:
+                    entry = None
+                else:
+                    entry.mtime_ns, entry.size = st.st_mtime_ns, st.st_size
+        if entry is not None:
+            _cache.move_to_end(name)
+            _stats['hits'] += 1
+            return entry
+
+        _stats['misses'] += 1
+        digest = cached_file_digest(path)
+        with metrics.timed('data_load', name):
+            frame = read_dataset(name, digest)
+        entry = _Entry(frame, st.st_mtime_ns, st.st_size, digest)
+        _cache[name] = entry
+        _cache.move_to_end(name)
+        _evict(keep=name)
+        return entry
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+        _digests.clear()
+
+
+def cache_info():
+    with _lock:
+        info = dict(_stats)
+        info['entries'] = len(_cache)
+        info['bytes'] = sum(e.nbytes for e in _cache.values())
+        info['budget_bytes'] = int(CACHE_BUDGET_MB * 1024 * 1024)
+        return info
@@ -0,0 +1,484 @@
+"""
+Static HTML snapshot of the report, for serving read-only traffic from a
+static host or CDN while the Streamlit app is kept for interactive use.
+
+Every section is rendered by its own render() against StaticPage, a stand-in
+for the subset of the streamlit API the sections use: markdown and captions
+are converted with mistune, LaTeX is typeset in the browser by KaTeX, plotly
+figures are embedded as JSON and drawn when scrolled into view, and images,
+plotly.js, KaTeX (script, stylesheet and fonts), the stylesheet and scripts
+are written once under assets/ with the content hash in their name, so they
+can be cached forever and the bundle needs nothing from other hosts. Widgets
+return their defaults, so the pages show the app's initial (national) view.
+
+KaTeX is read from KATEX_DIR, which is filled from KATEX_URL on first use
+(copy a KaTeX dist/ directory there to export offline).
+
+The pages are rebuilt only when a file in Datasets/ or Images/ or any module
+of this repo the pages render through changes; manifest.json records the
+hash of those inputs.
+
+    python export.py                # writes site/, skipped when up to date
+    python export.py --force --out /var/www/teds
+"""
+import argparse
+import hashlib
+import html
+import importlib
+import io
+import json
+import os
+import re
+import sys
+import textwrap
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import mistune
+import pandas as pd
+import plotly.offline
+import streamlit
+import streamlit.logger
+from PIL import Image
+
+import data_store
+import image_assets
+import sections
+from sections import overview
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+EXPORT_DIR = os.environ.get('TEDS_EXPORT_DIR', os.path.join(ROOT, 'site'))
+ASSET_DIR = 'assets'
+MANIFEST = 'manifest.json'
+APP_URL = os.environ.get('TEDS_APP_URL', 'https://share.streamlit.io/corpuzn12/ted_d_app/main/cap_app.py')
+## KaTeX build bundled for st.latex: a local dist/ directory, downloaded from KATEX_URL when missing
+KATEX_DIR = os.environ.get('TEDS_KATEX_DIR', os.path.join(ROOT, '.katex'))
+KATEX_URL = os.environ.get('TEDS_KATEX_URL', 'https://cdn.jsdelivr.net/npm/katex@0.16.4/dist')
+
+OVERVIEW = 'Overview'
+PAGES = OrderedDict([(OVERVIEW, 'index.html')] +
+                    [(name, module.rsplit('.', 1)[-1] + '.html') for name, module in sections.SECTIONS.items()])
+
+CSS = """
+body { margin: 0; font-family: "Source Sans Pro", -apple-system, "Segoe UI", Roboto, sans-serif; color: #262730; line-height: 1.6; }
+nav { padding: 0.75rem 1rem; background: #f0f2f6; font-size: 0.95rem; }
+nav a { margin-right: 1.25rem; color: #262730; text-decoration: none; }
+nav a.current { font-weight: 600; border-bottom: 2px solid #ff4b4b; }
+main { max-width: 730px; margin: 0 auto; padding: 2rem 1rem 4rem; }
+img { max-width: 100%; height: auto; }
+pre { background: #f0f2f6; padding: 1rem; overflow-x: auto; border-radius: 0.25rem; font-size: 0.85rem; }
+.latex { overflow-x: auto; margin: 1rem 0; white-space: pre-wrap; }
+.plotly-figure { min-height: 450px; margin: 1rem 0; }
+.caption { color: rgba(38, 39, 48, 0.6); font-size: 0.85rem; }
+.alert { background: #fffce7; padding: 0.75rem 1rem; border-radius: 0.25rem; }
+.widget span { font-weight: 600; }
+.table { overflow-x: auto; }
+table.dataframe { border-collapse: collapse; font-size: 0.85rem; }
+table.dataframe th, table.dataframe td { padding: 0.25rem 0.5rem; border: 1px solid #e6e9ef; text-align: right; }
+footer { max-width: 730px; margin: 0 auto 2rem; padding: 0 1rem; font-size: 0.85rem; color: rgba(38, 39, 48, 0.6); }
+"""
+
+## draws each figure from its embedded JSON once it is near the viewport
+FIGURES_JS = """
+(function () {
+  function draw(el) {
+    var spec = JSON.parse(el.firstElementChild.textContent);
+    Plotly.newPlot(el, spec.data, spec.layout, {responsive: true});
+  }
+  var figures = document.querySelectorAll('.plotly-figure');
+  if (!('IntersectionObserver' in window)) { figures.forEach(draw); return; }
+  var observer = new IntersectionObserver(function (entries) {
+    entries.forEach(function (entry) {
+      if (entry.isIntersecting) { observer.unobserve(entry.target); draw(entry.target); }
+    });
+  }, {rootMargin: '400px'});
+  figures.forEach(function (el) { observer.observe(el); });
+})();
+"""
+
+## the TeX source stays on the page if KaTeX cannot be loaded
+LATEX_JS = """
+document.querySelectorAll('.latex').forEach(function (el) {
+  if (window.katex) katex.render(el.textContent, el, {displayMode: true, throwOnError: false});
+});
+"""
+
+PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<link rel="stylesheet" href="{css}">
+{head}</head>
+<body>
+<nav>{nav}</nav>
+<main>
+{body}
+</main>
+<footer>A static snapshot of the report. The filters and the model explorer are in the <a href="{app_url}">interactive app</a>.</footer>
+{scripts}</body>
+</html>
+"""
+
+_TAG = re.compile(r'</?[A-Za-z][^>]*>')
+_CSS_URL = re.compile(r'url\((fonts/[^)?#]+)\)')
+
+
+def _write(path, data):
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _markdown(body, unsafe_allow_html=False):
+    text = textwrap.dedent(body)
+    if not unsafe_allow_html:
+        ## streamlit drops raw HTML unless it is allowed
+        text = _TAG.sub('', text)
+    return mistune.markdown(text, escape=False)
+
+
+def _table(data):
+    if not isinstance(data, pd.DataFrame):
+        data = pd.DataFrame(data)
+    return '<div class="table">%s</div>' % data.to_html(border=0, na_rep='')
+
+
+def report_modules():
+    """Source files of every module of this repo the sections import (charts.py, figure_cache.py, ...) and export.py."""
+    for module_name in sections.SECTIONS.values():
+        importlib.import_module(module_name)
+    paths = set([os.path.abspath(__file__)])
+    for module in list(sys.modules.values()):
+        path = getattr(module, '__file__', None)
+        if path and path.endswith('.py') and os.path.abspath(path).startswith(ROOT + os.sep):
+            paths.add(os.path.abspath(path))
+    return sorted(paths)
+
+
+def input_digest():
+    """SHA-1 over every file in Datasets/ and Images/ (but not the derived copies), the report's modules and KaTeX."""
+    skip = (data_store.COLUMNAR_DIR, image_assets.VARIANT_DIR)
+    paths = []
+    for top in (data_store.DATA_DIR, image_assets.IMAGE_DIR):
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames[:] = sorted(d for d in dirnames if os.path.join(dirpath, d) not in skip and d != '__pycache__')
+            paths += [os.path.join(dirpath, name) for name in sorted(filenames)]
+    paths += report_modules()
+    h = hashlib.sha1(KATEX_URL.encode())
+    for path in paths:
+        h.update(('%s %s\n' % (os.path.relpath(path, ROOT), data_store.cached_file_digest(path))).encode())
+    return h.hexdigest()
+
+
+class KatexUnavailable(Exception):
+    pass
+
+
+def _fetch(name):
+    import urllib.request
+    path = os.path.join(KATEX_DIR, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    url = '%s/%s' % (KATEX_URL, name)
+    try:
+        with urllib.request.urlopen(url, timeout=30) as response:
+            data = response.read()
+    except OSError as e:
+        raise KatexUnavailable('cannot download %s (%s). Copy the files of a KaTeX dist/ directory (katex.min.js, '
+                               'katex.min.css and fonts/) into %s, or point TEDS_KATEX_DIR at one.' % (url, e, KATEX_DIR))
+    _write(path, data)
+
+
+def katex_assets(bundle):
+    """
+    (stylesheet, script) asset URLs of the bundled KaTeX. Its fonts are added
+    under their hashed names and the stylesheet rewritten to point at them.
+    """
+    for name in ('katex.min.js', 'katex.min.css'):
+        if not os.path.exists(os.path.join(KATEX_DIR, name)):
+            _fetch(name)
+    with open(os.path.join(KATEX_DIR, 'katex.min.css')) as f:
+        css = f.read()
+    fonts = {}
+    for font in sorted(set(_CSS_URL.findall(css))):
+        if not os.path.exists(os.path.join(KATEX_DIR, font)):
+            _fetch(font)
+        with open(os.path.join(KATEX_DIR, font), 'rb') as f:
+            stem, ext = os.path.splitext(os.path.basename(font))
+            ## the stylesheet sits next to the fonts in assets/
+            fonts[font] = bundle.add(f.read(), stem, ext[1:]).split('/', 1)[1]
+    css = _CSS_URL.sub(lambda m: 'url(%s)' % fonts[m.group(1)], css)
+    with open(os.path.join(KATEX_DIR, 'katex.min.js'), 'rb') as f:
+        script = bundle.add(f.read(), 'katex', 'js')
+    return bundle.add(css.encode(), 'katex', 'css'), script
+
+
+class Bundle(object):
+    """Files under <out>/assets/ named <stem>.<sha1[:12]>.<ext>; unchanged files are not rewritten."""
+
+    def __init__(self, out_dir):
+        self.asset_dir = os.path.join(out_dir, ASSET_DIR)
+        self.names = set()
+        os.makedirs(self.asset_dir, exist_ok=True)
+
+    def add(self, data, stem, ext):
+        name = '%s.%s.%s' % (stem, hashlib.sha1(data).hexdigest()[:12], ext)
+        path = os.path.join(self.asset_dir, name)
+        if not os.path.exists(path):
+            _write(path, data)
+        self.names.add(name)
+        return '%s/%s' % (ASSET_DIR, name)
+
+    def prune(self):
+        for name in os.listdir(self.asset_dir):
+            if name not in self.names:
+                os.remove(os.path.join(self.asset_dir, name))
+
+
+class StaticPage(object):
+    """
+    The streamlit calls used by the sections, appending HTML instead of
+    sending elements. Widgets return their default value and show it as text.
+    """
+
+    def __init__(self, bundle):
+        self.bundle = bundle
+        self.parts = []
+        self.figures = 0
+        self.equations = 0
+        self.images = 0
+
+    @property
+    def sidebar(self):
+        return _Sidebar(self.bundle)
+
+    def _add(self, part):
+        self.parts.append(part)
+
+    def _heading(self, tag, body):
+        anchor = re.sub('[^a-z0-9]+', '-', body.lower()).strip('-')
+        self._add('<%s id="%s">%s</%s>' % (tag, anchor, html.escape(body), tag))
+
+    def title(self, body):
+        self._heading('h1', body)
+
+    def header(self, body):
+        self._heading('h2', body)
+
+    def subheader(self, body):
+        self._heading('h3', body)
+
+    def markdown(self, body, unsafe_allow_html=False):
+        self._add(_markdown(body, unsafe_allow_html))
+
+    def caption(self, body):
+        self._add('<div class="caption">%s</div>' % _markdown(body))
+
+    def warning(self, body):
+        self._add('<div class="alert">%s</div>' % _markdown(body))
+
+    def code(self, body, language='python'):
+        self._add('<pre><code class="language-%s">%s</code></pre>' % (language, html.escape(textwrap.dedent(body).strip())))
+
+    def latex(self, body):
+        self.equations += 1
+        self._add('<div class="latex">%s</div>' % html.escape(textwrap.dedent(body).strip()))
+
+    def image(self, image, caption=None):
+        img = Image.open(io.BytesIO(image))
+        src = self.bundle.add(image, 'image', img.format.lower())
+        self.images += 1
+        self._add('<img src="%s" width="%d" height="%d" alt="%s" loading="lazy">' % (
+            src, img.width, img.height, html.escape(caption or '')))
+        if caption:
+            self.caption(caption)
+
+    def report_image(self, name):
+        ## stands in for sections.shared.report_image: the export's WebP (or PNG) variants at every width
+        fmt = image_assets.EXPORT_FORMATS[0]
+        sources = []
+        for width in image_assets.WIDTHS:
+            data = image_assets.image_bytes(name, width, fmt)
+            size = Image.open(io.BytesIO(data)).size
+            if all(size != s for _, s in sources):
+                sources.append((self.bundle.add(data, 'image', fmt), size))
+        src, size = next(((u, s) for u, s in sources if s[0] >= image_assets.DISPLAY_WIDTH), sources[-1])
+        self.images += 1
+        self._add('<img src="%s" srcset="%s" sizes="(max-width: 730px) 100vw, 730px" width="%d" height="%d" alt="" '
+                  'loading="lazy">' % (src, ', '.join('%s %dw' % (u, s[0]) for u, s in sources), size[0], size[1]))
+
+    def plotly_chart(self, figure_or_data, use_container_width=False, **kwargs):
+        self.figures += 1
+        ## "</" would end the script element early
+        spec = figure_or_data.to_json().replace('</', '<\\/')
+        self._add('<div class="plotly-figure"><script type="application/json">%s</script></div>' % spec)
+
+    def dataframe(self, data=None, width=None, height=None):
+        self._add(_table(data))
+
+    table = dataframe
+
+    def write(self, *args):
+        for arg in args:
+            if isinstance(arg, str):
+                self.markdown(arg)
+            elif isinstance(arg, (pd.DataFrame, pd.Series)):
+                self.dataframe(arg)
+            else:
+                self.markdown(str(arg))
+
+    @contextmanager
+    def expander(self, label, expanded=False):
+        self._add('<details%s><summary>%s</summary>' % (' open' if expanded else '', html.escape(label)))
+        yield self
+        self._add('</details>')
+
+    def _widget(self, label, shown):
+        self._add('<p class="widget"><span>%s:</span> %s</p>' % (html.escape(label), html.escape(shown)))
+
+    def radio(self, label, options, index=0, format_func=str, key=None, **kwargs):
+        value = list(options)[index]
+        self._widget(label, str(format_func(value)))
+        return value
+
+    selectbox = radio
+
+    def multiselect(self, label, options, default=None, format_func=str, key=None, **kwargs):
+        if default is None:
+            value = []
+        else:
+            value = list(default) if isinstance(default, (list, tuple)) else [default]
+        self._widget(label, ', '.join(str(format_func(v)) for v in value) or 'none')
+        return value
+
+    def checkbox(self, label, value=False, key=None, **kwargs):
+        self._widget(label, 'yes' if value else 'no')
+        return value
+
+    def slider(self, label, min_value=None, max_value=None, value=None, step=None, format=None, key=None, **kwargs):
+        value = min_value if value is None else value
+        self._widget(label, ' to '.join(str(v) for v in value) if isinstance(value, tuple) else str(value))
+        return value
+
+    def button(self, label, key=None, **kwargs):
+        return False
+
+    def experimental_get_query_params(self):
+        return {}
+
+    def html(self, title, nav, app_url=APP_URL):
+        """The complete page around the recorded elements."""
+        head, scripts = '', ''
+        if self.equations:
+            stylesheet, script = katex_assets(self.bundle)
+            head += '<link rel="stylesheet" href="%s">\n' % stylesheet
+            scripts += '<script defer src="%s"></script>\n' % script
+            scripts += '<script defer src="%s"></script>\n' % self.bundle.add(LATEX_JS.encode(), 'latex', 'js')
+        if self.figures:
+            scripts += '<script defer src="%s"></script>\n' % self.bundle.add(_plotly_js(), 'plotly', 'js')
+            scripts += '<script defer src="%s"></script>\n' % self.bundle.add(FIGURES_JS.encode(), 'figures', 'js')
+        return PAGE.format(title=html.escape(title), css=self.bundle.add(CSS.encode(), 'report', 'css'), head=head,
+                           nav=nav, body='\n'.join(self.parts), app_url=html.escape(app_url), scripts=scripts)
+
+
+class _Sidebar(StaticPage):
+    ## the sidebar only holds filters and diagnostics; widgets still return their defaults
+
+    def _add(self, part):
+        pass
+
+
+_plotly = []
+
+
+def _plotly_js():
+    if not _plotly:
+        _plotly.append(plotly.offline.get_plotlyjs().encode())
+    return _plotly[0]
+
+
+@contextmanager
+def rendering_to(page):
+    """Point the sections' `st` (and their report_image) at `page` while they render."""
+    for module_name in sections.SECTIONS.values():
+        importlib.import_module(module_name)
+    from sections import shared
+    replaced = {'st': (streamlit, page), 'report_image': (shared.report_image, page.report_image)}
+    patched = [(module, attr) for name, module in list(sys.modules.items())
+               if name == 'sections' or name.startswith('sections.')
+               for attr, (original, _) in replaced.items() if getattr(module, attr, None) is original]
+    for module, attr in patched:
+        setattr(module, attr, replaced[attr][1])
+    try:
+        yield page
+    finally:
+        for module, attr in patched:
+            setattr(module, attr, replaced[attr][0])
+
+
+def render_page(name, bundle):
+    with rendering_to(StaticPage(bundle)) as page:
+        overview.render_header()
+        if name == OVERVIEW:
+            overview.render()
+        else:
+            sections.render(name)
+    return page
+
+
+def _nav(current):
+    return ''.join('<a href="%s"%s>%s</a>' % (filename, ' class="current"' if name == current else '', html.escape(name))
+                   for name, filename in PAGES.items())
+
+
+def export(out_dir=EXPORT_DIR, force=False):
+    """
+    Write every page and its assets to `out_dir` and drop stale assets.
+    Returns the manifest, or None when the snapshot already matches the inputs.
+    """
+    digest = input_digest()
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    if not force and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            if json.load(f).get('inputs') == digest:
+                return None
+
+    bundle = Bundle(out_dir)
+    pages = OrderedDict()
+    for name, filename in PAGES.items():
+        t0 = time.perf_counter()
+        page = render_page(name, bundle)
+        data = page.html('%s | TEDS-D Medicaid Expansion' % name, _nav(name)).encode()
+        _write(os.path.join(out_dir, filename), data)
+        pages[filename] = {'section': name, 'bytes': len(data), 'figures': page.figures, 'images': page.images,
+                           'render_s': round(time.perf_counter() - t0, 3)}
+    bundle.prune()
+    manifest = {'inputs': digest, 'pages': pages, 'assets': sorted(bundle.names)}
+    ## written last, so an interrupted export is redone on the next run
+    _write(manifest_path, json.dumps(manifest, indent=2).encode())
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--out', default=EXPORT_DIR, help='output directory (default: site/, or TEDS_EXPORT_DIR)')
+    parser.add_argument('--force', action='store_true', help='rebuild even if the inputs are unchanged')
+    args = parser.parse_args()
+    ## bare mode warns about the missing server on every call
+    streamlit.logger.set_log_level('ERROR')
+    try:
+        manifest = export(args.out, args.force)
+    except KatexUnavailable as e:
+        parser.exit(1, '%s: %s\n' % (parser.prog, e))
+    if manifest is None:
+        print('%s is up to date' % args.out)
+    else:
+        for filename, page in manifest['pages'].items():
+            print('%-20s %7.0fK  %d figures, %d images  %.1f s' % (
+                filename, page['bytes'] / 1024.0, page['figures'], page['images'], page['render_s']))
+        asset_bytes = sum(os.path.getsize(os.path.join(args.out, ASSET_DIR, n)) for n in manifest['assets'])
+        print('%d assets, %.0fK' % (len(manifest['assets']), asset_bytes / 1024.0))
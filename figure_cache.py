@@ -0,0 +1,153 @@
+"""
+Process-wide cache of finished plotly figures, persisted to disk.
+
+A figure is keyed by its builder (including the source hash of the builder's
+module), the content hash of every dataset it is built from and its
+parameters, so unchanged charts are never rebuilt and a changed CSV or chart
+function invalidates exactly the figures that depend on it. The key only
+hashes the files, so a disk hit never parses the datasets. Figures are kept
+in memory for every session of the process and written as JSON under
+FIGURE_CACHE_DIR so a fresh process starts warm; writing a builder's figure
+for a new code/data version removes the files of its older versions. Figures
+of filtered data (see filters.py) are only kept in memory, there are too many
+selections to persist.
+"""
+import hashlib
+import inspect
+import os
+import threading
+from collections import OrderedDict
+
+import plotly
+import plotly.io as pio
+
+import data_store
+import filters
+import metrics
+
+
+FIGURE_CACHE_DIR = os.environ.get(
+    'TEDS_FIGURE_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.figure_cache'))
+MAX_FIGURES = 128
+
+_figures = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'disk_hits': 0, 'misses': 0}
+## (disk group, version) pairs whose older disk versions were already removed
+_pruned = set()
+
+
+def _label(builder):
+    return '%s.%s' % (builder.__module__, builder.__name__)
+
+
+def figure_version(builder, datasets):
+    """Hash of everything but the parameters: builder module source, plotly version and dataset contents."""
+    parts = [_label(builder), data_store.cached_file_digest(inspect.getsourcefile(builder)), plotly.__version__]
+    parts += ['%s=%s' % (name, data_store.dataset_digest(name)) for name in datasets]
+    return hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+
+def _key(version, params):
+    parts = [version] + ['%s=%r' % item for item in sorted(params.items())]
+    return hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+
+def figure_key(builder, datasets, params):
+    return _key(figure_version(builder, datasets), params)
+
+
+def _disk_group(builder, datasets):
+    ## a builder applied to a given list of datasets; its files differ by version and parameters
+    return '%s-%s' % (_label(builder), hashlib.sha1(repr(list(datasets)).encode()).hexdigest()[:8])
+
+
+def _disk_path(group, version, key):
+    return os.path.join(FIGURE_CACHE_DIR, '%s-%s-%s.json' % (group, version[:12], key))
+
+
+def _prune(group, version):
+    ## figures of the group's other code/data versions are never read again
+    if (group, version) in _pruned:
+        return
+    _pruned.add((group, version))
+    prefix, current = group + '-', '%s-%s-' % (group, version[:12])
+    for name in os.listdir(FIGURE_CACHE_DIR):
+        if name.startswith(prefix) and not name.startswith(current) and name.endswith('.json'):
+            try:
+                os.remove(os.path.join(FIGURE_CACHE_DIR, name))
+            except OSError:
+                pass
+
+
+def _remember(key, fig, stat):
+    with _lock:
+        _stats[stat] += 1
+        _figures[key] = fig
+        _figures.move_to_end(key)
+        while len(_figures) > MAX_FIGURES:
+            _figures.popitem(last=False)
+
+
+def cached_figure(builder, datasets=(), where=None, **params):
+    """
+    builder(*[load_dataset(name) for name in datasets], **params), built once
+    per dataset version and parameter set. `where`, a filters.Selection,
+    restricts the rows of every dataset. Treat the result as read-only.
+    """
+    if where == filters.NATIONAL:
+        where = None
+    version = figure_version(builder, datasets)
+    key = _key(version, dict(params, where=where) if where else params)
+    with _lock:
+        fig = _figures.get(key)
+        if fig is not None:
+            _figures.move_to_end(key)
+            _stats['hits'] += 1
+            return fig
+
+    label = _label(builder)
+    if where:
+        with metrics.timed('figure_build', label):
+            fig = builder(*[filters.select(name, where) for name in datasets], **params)
+        _remember(key, fig, 'misses')
+        return fig
+
+    group = _disk_group(builder, datasets)
+    path = _disk_path(group, version, key)
+    if os.path.exists(path):
+        with metrics.timed('figure_load', label), open(path) as f:
+            fig = pio.from_json(f.read())
+        stat = 'disk_hits'
+    else:
+        with metrics.timed('figure_build', label):
+            fig = builder(*[data_store.load_dataset(name) for name in datasets], **params)
+        stat = 'misses'
+        try:
+            os.makedirs(FIGURE_CACHE_DIR, exist_ok=True)
+            tmp = '%s.%d.tmp' % (path, os.getpid())
+            with open(tmp, 'w') as f:
+                f.write(pio.to_json(fig, validate=False))
+            os.replace(tmp, path)
+            _prune(group, version)
+        except OSError:
+            ## read-only deployments still get the in-memory cache
+            pass
+    _remember(key, fig, stat)
+    return fig
+
+
+def clear_cache(disk=False):
+    with _lock:
+        _figures.clear()
+    if disk and os.path.isdir(FIGURE_CACHE_DIR):
+        for name in os.listdir(FIGURE_CACHE_DIR):
+            if name.endswith('.json'):
+                os.remove(os.path.join(FIGURE_CACHE_DIR, name))
+
+
+def cache_info():
+    with _lock:
+        info = dict(_stats)
+        info['entries'] = len(_figures)
+        return info
@@ -0,0 +1,141 @@
+"""
+State / year / implementation-year filtering of the aggregate tables.
+
+Each table gets a GroupIndex once per file version: its row positions sorted
+by (state category code, year), with one int64 sort key per row. A selection of
+states and a year window is then one vectorized searchsorted per state bound
+and a take of the matching positions, never a boolean scan of the table, so a
+filter change costs O(states x log rows + matching rows) however finely the
+tables are split. Matching rows come back in the table's original order, so
+filtered charts keep their category and colour order.
+"""
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+import data_store
+import teds_pipeline
+
+
+## (state column, year column) of every filterable dataset
+KEYS = {
+    'dis_rate': ('state', 'year'),
+    'ptype_rate': ('state', 'year'),
+    'prior_rate': ('state', 'year'),
+    'homeless_rate': ('state', 'year'),
+    'race_agg': ('STATE_NAME', 'DISYR'),
+    'gender_agg': ('STATE_NAME', 'DISYR'),
+    'imp_yr_agg': ('STATE_NAME', 'DISYR'),
+    'imp_yr_agg_1m': ('STATE_NAME', 'DISYR'),
+}
+
+## state label -> implementation year, for the states kept in the aggregates
+STATE_COHORTS = dict((label, teds_pipeline.imp_year(fips)) for fips, label in teds_pipeline.STATE_LABELS.items()
+                     if fips not in teds_pipeline.DROPPED_STATES)
+COHORTS = sorted(set(STATE_COHORTS.values()), key=lambda c: (c == 'Never', c))
+## the published aggregates label Mississippi (FIPS 28) by its code
+DISPLAY_NAMES = {'28.0': 'MISSISSIPPI'}
+
+## states: sorted tuple of labels or None for all; years: inclusive (first, last) or None
+Selection = namedtuple('Selection', ['states', 'years'])
+NATIONAL = Selection(None, None)
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def _ranges(starts, ends):
+    ## concatenation of arange(s, e) for every pair, without a Python loop
+    lengths = ends - starts
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+
+class GroupIndex(object):
+
+    def __init__(self, frame, state, year):
+        labels = frame[state].astype('category')
+        self.codes = dict((label, i) for i, label in enumerate(labels.cat.categories))
+        codes = labels.cat.codes.to_numpy().astype(np.int64)
+        years = frame[year].to_numpy().astype(np.int64)
+        self.first_year = int(years.min()) if len(years) else 0
+        self.last_year = int(years.max()) if len(years) else -1
+        self.span = self.last_year - self.first_year + 1
+        key = codes * self.span + (years - self.first_year)
+        self.order = np.argsort(key, kind='stable')
+        self.key = key[self.order]
+
+    def rows(self, states=None, years=None):
+        """Positions of the rows in `states` within the `years` window, in table order."""
+        if states is None:
+            codes = np.arange(len(self.codes), dtype=np.int64)
+        else:
+            codes = np.array([self.codes[s] for s in states if s in self.codes], dtype=np.int64)
+        first, last = years if years is not None else (self.first_year, self.last_year)
+        first = max(first, self.first_year) - self.first_year
+        last = min(last, self.last_year) - self.first_year
+        if first > last or not len(codes):
+            return np.empty(0, dtype=np.int64)
+        starts = np.searchsorted(self.key, codes * self.span + first, 'left')
+        ends = np.searchsorted(self.key, codes * self.span + last, 'right')
+        return np.sort(self.order[_ranges(starts, ends)])
+
+
+def group_index(name):
+    """The GroupIndex of load_dataset(name), rebuilt when the file changes."""
+    digest = data_store.dataset_digest(name)
+    with _lock:
+        cached = _indexes.get(name)
+    if cached is not None and cached[0] == digest:
+        return cached[1]
+    index = GroupIndex(data_store.load_dataset(name), *KEYS[name])
+    with _lock:
+        _indexes[name] = (digest, index)
+    return index
+
+
+def select(name, selection=NATIONAL):
+    """load_dataset(name) restricted to `selection`; the unfiltered frame is shared, not copied."""
+    frame = data_store.load_dataset(name)
+    if selection is None or selection == NATIONAL:
+        return frame
+    return frame.take(group_index(name).rows(selection.states, selection.years))
+
+
+def display_name(label):
+    return DISPLAY_NAMES.get(label, label.strip())
+
+
+def state_options(names=tuple(KEYS)):
+    """State labels that occur in the `names` tables, sorted by display name."""
+    labels = set()
+    for name in names:
+        labels.update(group_index(name).codes)
+    return sorted(labels, key=display_name)
+
+
+def year_range(name='imp_yr_agg'):
+    index = group_index(name)
+    return index.first_year, index.last_year
+
+
+def selection(states=(), years=None, cohorts=(), full_years=None):
+    """
+    Selection for the sidebar choices: the chosen states (all when none are
+    chosen) that belong to the chosen implementation years, and the year
+    window (dropped when it spans all of `full_years`).
+    """
+    chosen = set(states) if states else None
+    if cohorts and set(cohorts) != set(COHORTS):
+        in_cohorts = set(s for s, c in STATE_COHORTS.items() if c in cohorts)
+        chosen = in_cohorts if chosen is None else chosen & in_cohorts
+    if years is not None and full_years is not None and tuple(years) == tuple(full_years):
+        years = None
+    return Selection(tuple(sorted(chosen)) if chosen is not None else None,
+                     tuple(int(y) for y in years) if years is not None else None)
+
+
+def clear_cache():
+    with _lock:
+        _indexes.clear()
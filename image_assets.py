@@ -0,0 +1,231 @@
+"""
+Width-adapted WebP/PNG variants of the report images in Images/.
+
+st.image re-encodes a PIL image on every call, so opening the full-size JPEGs
+in the script costs a decode and an encode per session. Instead the variants
+are generated once (at build time, or on first use) under Images/variants/,
+named by the source's SHA-1 and the target width, and served as raw bytes.
+st.image only passes bytes through untouched when they are already in the
+output format it picks and no wider than its content column, so the app gets
+a JPEG (PNG for images with alpha) at most MAX_APP_WIDTH wide, shown with the
+matching output_format (see app_image). A source that already is such a file
+is served as is rather than compressed a second time. The WebP variants at every width are
+for the static export. Encoded bytes are kept in memory for the process, and a
+source is decoded at most once per process however many widths are requested.
+
+    python image_assets.py          # (re)build every variant, drop stale ones
+"""
+import argparse
+import io
+import os
+import threading
+
+from PIL import Image, features
+
+import data_store
+import metrics
+
+
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Images')
+VARIANT_DIR = os.path.join(IMAGE_DIR, 'variants')
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+## target widths in px; a variant is never wider than its source
+WIDTHS = (480, 720, 1440)
+## st.image resizes (and re-encodes) anything wider than its content column
+MAX_APP_WIDTH = 730
+## width served to the app, the content column of the centered layout
+DISPLAY_WIDTH = min(int(os.environ.get('TEDS_IMAGE_WIDTH', 720)), MAX_APP_WIDTH)
+## formats of the static export's variants, best first
+EXPORT_FORMATS = ('webp', 'png') if features.check('webp') else ('png',)
+
+## name -> (mtime/size stamp, SHA-1, width, has alpha, PIL format in lower case)
+_info = {}
+_decoded = {}
+_encoded = {}
+_lock = threading.Lock()
+_stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'decodes': 0}
+
+
+def image_path(name):
+    return os.path.join(IMAGE_DIR, name)
+
+
+def source_images():
+    return sorted(n for n in os.listdir(IMAGE_DIR) if n.lower().endswith(SOURCE_EXTENSIONS))
+
+
+def _source_info(name):
+    ## digest, width, alpha and format of Images/<name>, rehashed and its header reread only when its mtime or size changes
+    st = os.stat(image_path(name))
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        cached = _info.get(name)
+    if cached is not None and cached[0] == stamp:
+        return cached[1:]
+    digest = data_store.file_digest(image_path(name))
+    with Image.open(image_path(name)) as f:
+        info = (digest, f.width, 'A' in f.getbands() or f.mode == 'P', (f.format or '').lower())
+    with _lock:
+        _info[name] = (stamp,) + info
+    return info
+
+
+def image_digest(name):
+    """SHA-1 of Images/<name>, rehashed only when its mtime or size changes."""
+    return _source_info(name)[0]
+
+
+def variant_width(source_width, width=DISPLAY_WIDTH, max_width=None):
+    """The smallest of WIDTHS covering `width`, capped at the source width (and `max_width`)."""
+    target = next((w for w in WIDTHS if w >= width), WIDTHS[-1])
+    return min(target, source_width, max_width or target)
+
+
+def app_format(name):
+    """Format of the app's variant: JPEG, or PNG when the source has an alpha channel."""
+    return 'png' if _source_info(name)[2] else 'jpeg'
+
+
+def _is_source(name, width, fmt):
+    ## the variant would be the source file itself: same format, not resized
+    _, source_width, _, source_fmt = _source_info(name)
+    return width == source_width and fmt == source_fmt
+
+
+def variant_path(name, digest, width, fmt):
+    stem = os.path.splitext(name)[0]
+    return os.path.join(VARIANT_DIR, '%s-%s-%dw.%s' % (stem, digest[:12], width, fmt))
+
+
+def _source(name, digest):
+    ## decoded RGB(A) image, once per process and file version
+    with _lock:
+        img = _decoded.get(digest)
+    if img is None:
+        with metrics.timed('image_decode', name), Image.open(image_path(name)) as f:
+            img = f.convert('RGBA' if 'A' in f.getbands() else 'RGB')
+        with _lock:
+            _decoded[digest] = img
+            _stats['decodes'] += 1
+    return img
+
+
+def encode(img, width, fmt):
+    if width < img.width:
+        img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+    buf = io.BytesIO()
+    if fmt == 'jpeg':
+        img.save(buf, 'JPEG', quality=85, optimize=True, progressive=True)
+    elif fmt == 'webp':
+        img.save(buf, 'WEBP', quality=85, method=6)
+    elif fmt == 'png':
+        img.save(buf, 'PNG', optimize=True)
+    else:
+        raise ValueError('unknown image format %r' % fmt)
+    return buf.getvalue()
+
+
+def image_bytes(name, width=DISPLAY_WIDTH, fmt=None, max_width=None):
+    """
+    Encoded bytes of Images/<name> at the variant covering `width` (at most
+    `max_width`), in `fmt` (default: the app's format). The source file's
+    own bytes when that is the same image; otherwise read from
+    Images/variants/ when built, else encoded and written.
+    """
+    fmt = fmt or app_format(name)
+    digest, source_width, _, _ = _source_info(name)
+    width = variant_width(source_width, width, max_width)
+    key = (digest, width, fmt)
+    with _lock:
+        data = _encoded.get(key)
+        if data is not None:
+            _stats['hits'] += 1
+            return data
+
+    path = image_path(name) if _is_source(name, width, fmt) else variant_path(name, digest, width, fmt)
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        stat = 'disk_hits'
+    else:
+        img = _source(name, digest)
+        with metrics.timed('image_encode', name):
+            data = encode(img, width, fmt)
+        stat = 'misses'
+        try:
+            os.makedirs(VARIANT_DIR, exist_ok=True)
+            tmp = '%s.%d.tmp' % (path, os.getpid())
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            ## read-only deployments still get the in-memory copy
+            pass
+    with _lock:
+        _stats[stat] += 1
+        _encoded[key] = data
+    return data
+
+
+def app_image(name):
+    """
+    (bytes, output_format) for st.image(data, output_format=...): the app's
+    variant, which st.image sends as is.
+    """
+    fmt = app_format(name)
+    return image_bytes(name, DISPLAY_WIDTH, fmt, MAX_APP_WIDTH), fmt.upper()
+
+
+def _variants(name, source_width):
+    ## (width, fmt) of every variant of a source: the app's and the export's
+    app = (variant_width(source_width, DISPLAY_WIDTH, MAX_APP_WIDTH), app_format(name))
+    export = [(width, fmt) for width in sorted(set(variant_width(source_width, w) for w in WIDTHS))
+              for fmt in EXPORT_FORMATS]
+    return [app] + [v for v in export if v != app]
+
+
+def build(names=None):
+    """Write every width/format variant of the source images and remove stale ones."""
+    os.makedirs(VARIANT_DIR, exist_ok=True)
+    current = set()
+    for name in names or source_images():
+        digest, source_width, _, _ = _source_info(name)
+        sizes = []
+        for width, fmt in _variants(name, source_width):
+            if _is_source(name, width, fmt):
+                sizes.append('%d %s (source)' % (width, fmt))
+                continue
+            path = variant_path(name, digest, width, fmt)
+            current.add(os.path.basename(path))
+            if not os.path.exists(path):
+                with open(path, 'wb') as f:
+                    f.write(encode(_source(name, digest), width, fmt))
+            sizes.append('%d %s %.0fK' % (width, fmt, os.path.getsize(path) / 1024.0))
+        print('%-18s %5.0fK -> %s' % (name, os.path.getsize(image_path(name)) / 1024.0, ', '.join(sizes)))
+    if names is None:
+        for name in os.listdir(VARIANT_DIR):
+            if name not in current:
+                os.remove(os.path.join(VARIANT_DIR, name))
+
+
+def clear_cache():
+    with _lock:
+        _info.clear()
+        _decoded.clear()
+        _encoded.clear()
+
+
+def cache_info():
+    with _lock:
+        info = dict(_stats)
+        info['entries'] = len(_encoded)
+        info['bytes'] = sum(len(b) for b in _encoded.values())
+        return info
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('images', nargs='*', help='file names in Images/ (default: all)')
+    args = parser.parse_args()
+    build(args.images or None)
@@ -0,0 +1,290 @@
+"""
+Multiple imputation of the -9 codes in the 7M outpatient set, so the DiD and
+FE models can be fit on every row instead of the ~1M complete cases.
+
+Each covariate in teds_pipeline.REGRESSION_COLUMNS (REASON included) is held
+as int8 category codes. Chained equations then redraw one column at a time
+from a categorical model of that column given its (state, discharge year)
+cell and every other column, fit on the rows where it is observed:
+
+    P(x_j | cell, others) ~ P(x_j | cell) * prod_k P(x_k | x_j)
+
+Treat, Post and DID are functions of the cell, so rooting every conditional
+in it keeps the treatment contrast (and any state-by-year pattern) in the
+imputed values instead of pulling them toward the state or year average.
+REASON, the outcome, is imputed as a predictor of the other columns but the
+rows where it was missing are dropped before the models are fit
+(impute-then-delete), so no outcome is made up.
+
+Every table in that product is a bincount of code pairs: all pairs for one
+column come from one stacked bincount per row chunk, and the draws for the
+missing rows are a gather, a sum and a Gumbel-max per chunk. Each imputation
+draws its tables from their Dirichlet posterior (a proper imputation). The m
+imputations run in a process pool, each one fits the models through the
+sufficient-statistics cube (suff_cube.py) and only the estimates come back;
+they are pooled with Rubin's rules. On the 7M set a worker peaks at about
+1 GB (--jobs bounds the total) and an imputation takes about two minutes.
+
+    python imputation.py outp_7m.csv --m 20 --jobs 4   # writes Datasets/mi_pooled.csv
+"""
+import argparse
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import data_store
+import panel_models
+import suff_cube
+import teds_pipeline
+import wild_bootstrap
+from panel_models import ENTITY, TIME
+from teds_pipeline import MISSING
+
+
+IMPUTED = teds_pipeline.REGRESSION_COLUMNS
+RAW_COLUMNS = (ENTITY, TIME) + IMPUTED
+POOLED_FILE = 'mi_pooled.csv'
+
+## name -> (covariates, state/year effects, clustered by state) as in the app
+MODELS = OrderedDict([
+    ('dd_v', (panel_models.DD_V, False, False)),
+    ('dd_rt', (panel_models.DD_RT, False, False)),
+    ('FE_v', (panel_models.FE_V, True, False)),
+    ('FE_rt', (panel_models.FE_RT, True, False)),
+    ('FE clustered', (wild_bootstrap.PANELOLS, True, True)),
+])
+
+_raw = {}
+
+
+def pooled_path():
+    return os.path.join(data_store.DATA_DIR, POOLED_FILE)
+
+
+def load_raw(path, chunksize=1000000):
+    """The raw codes of the 7M set as int8 (DISYR int16), read in chunks to bound the peak."""
+    dtypes = dict((col, 'int8') for col in RAW_COLUMNS)
+    dtypes[TIME] = 'int16'
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, columns=list(RAW_COLUMNS)).astype(dtypes)
+    chunks = pd.read_csv(path, usecols=list(RAW_COLUMNS), chunksize=chunksize)
+    return pd.concat([chunk.astype(dtypes) for chunk in chunks], ignore_index=True)[list(RAW_COLUMNS)]
+
+
+def encode(raw, columns=IMPUTED):
+    """
+    Category codes 0..c-1 (-1 where MISSING) of `columns` as one int8 Fortran
+    matrix, and the raw code behind every category.
+    """
+    codes = np.empty((len(raw), len(columns)), dtype=np.int8, order='F')
+    levels = []
+    for j, col in enumerate(columns):
+        values = raw[col].to_numpy()
+        observed = np.unique(values[values != MISSING])
+        lookup = np.full(256, -1, dtype=np.int8)
+        lookup[observed.astype(np.int16) + 128] = np.arange(len(observed))
+        codes[:, j] = lookup[values.astype(np.int16) + 128]
+        levels.append(observed)
+    return codes, levels
+
+
+def decode(raw, codes, levels, columns=IMPUTED):
+    out = raw.copy()
+    for j, col in enumerate(columns):
+        out[col] = levels[j][codes[:, j]].astype(raw[col].dtype)
+    return out
+
+
+def _dirichlet(rng, counts, alpha):
+    ## one posterior draw per row of a count table, normalized over the last axis, as logs
+    draw = rng.gamma(counts + alpha)
+    return np.log(draw / draw.sum(axis=-1, keepdims=True)).astype(np.float32)
+
+
+class ChainedImputer(object):
+    """
+    Chained-equation imputation of int8 category codes.
+
+    `codes` is modified in place; `groups` (the state-year cell code) is the
+    always-observed root of every conditional.
+    """
+
+    def __init__(self, codes, groups, rng, alpha=1.0, chunk_rows=1000000):
+        self.codes = codes
+        self.groups = groups
+        self.n_groups = int(groups.max()) + 1
+        self.missing = codes < 0
+        self.sizes = [int(codes[:, j].max()) + 1 for j in range(codes.shape[1])]
+        self.rng = rng
+        self.alpha = alpha
+        self.chunk_rows = chunk_rows
+
+    def _tables(self, j):
+        ## P(x_j | group) and P(x_k | x_j) for every other predictor k, from the rows where x_j is observed
+        c = self.sizes[j]
+        others = [k for k in range(len(self.sizes)) if k != j]
+        sizes = [self.sizes[k] for k in others]
+        offsets = np.concatenate([[0], np.cumsum([c * s for s in sizes])])
+        root = np.zeros(self.n_groups * c)
+        pairs = np.zeros(offsets[-1])
+        observed = np.flatnonzero(~self.missing[:, j])
+        for start in range(0, len(observed), self.chunk_rows):
+            rows = observed[start:start + self.chunk_rows]
+            x = self.codes[rows, j].astype(np.int32)
+            root += np.bincount(self.groups[rows].astype(np.int32) * c + x, minlength=len(root))
+            idx = np.empty((len(rows), len(others)), dtype=np.int32)
+            for i, k in enumerate(others):
+                idx[:, i] = offsets[i] + x * sizes[i] + self.codes[rows, k]
+            pairs += np.bincount(idx.ravel(), minlength=len(pairs))
+        log_root = _dirichlet(self.rng, root.reshape(self.n_groups, c), self.alpha)
+        ## transposed to (c_k, c_j) so a gather by x_k gives one row per observation
+        log_pairs = [_dirichlet(self.rng, pairs[offsets[i]:offsets[i + 1]].reshape(c, sizes[i]), self.alpha).T.copy()
+                     for i in range(len(others))]
+        return log_root, others, log_pairs
+
+    def _initialize(self, j):
+        ## start from P(x_j | group) so every predictor is set before the chained passes
+        c = self.sizes[j]
+        observed = ~self.missing[:, j]
+        counts = np.bincount(self.groups[observed].astype(np.int32) * c + self.codes[observed, j],
+                             minlength=self.n_groups * c)
+        self._draw(j, np.flatnonzero(self.missing[:, j]),
+                   _dirichlet(self.rng, counts.reshape(self.n_groups, c), self.alpha), [], [])
+
+    def _draw(self, j, rows, log_root, others, log_pairs):
+        for start in range(0, len(rows), self.chunk_rows):
+            chunk = rows[start:start + self.chunk_rows]
+            logp = log_root[self.groups[chunk]]
+            for k, table in zip(others, log_pairs):
+                logp += table[self.codes[chunk, k]]
+            uniform = np.maximum(self.rng.random(logp.shape, dtype=np.float32), np.finfo(np.float32).tiny)
+            gumbel = -np.log(-np.log(uniform))
+            self.codes[chunk, j] = np.argmax(logp + gumbel, axis=1)
+
+    def run(self, iterations=5):
+        columns = [j for j in range(len(self.sizes)) if self.missing[:, j].any()]
+        for j in columns:
+            self._initialize(j)
+        for _ in range(iterations):
+            for j in columns:
+                self._draw(j, np.flatnonzero(self.missing[:, j]), *self._tables(j))
+        return self.codes
+
+
+def impute(raw, seed, iterations=5, chunk_rows=1000000):
+    """One completed copy of `raw`."""
+    rng = np.random.default_rng(seed)
+    codes, levels = encode(raw)
+    ## ~50 states x 11 years, more cells than int8 holds
+    cells = raw[ENTITY].to_numpy().astype(np.int32) * 10000 + raw[TIME].to_numpy()
+    groups = np.unique(cells, return_inverse=True)[1].astype(np.int16)
+    ChainedImputer(codes, groups, rng, chunk_rows=chunk_rows).run(iterations)
+    return decode(raw, codes, levels)
+
+
+def fit_models(raw, models=MODELS):
+    """The app's DiD and FE models on complete raw codes, through the cube."""
+    cube = suff_cube.SuffCube.from_frame(panel_models.derive_columns(raw))
+    return OrderedDict((name, cube.fit(covariates, effects=effects, cluster=cluster))
+                       for name, (covariates, effects, cluster) in models.items())
+
+
+def complete_cases(raw):
+    return raw[(raw[list(IMPUTED)] != MISSING).all(axis=1)]
+
+
+def _imputation_task(args):
+    path, seed, iterations, chunk_rows = args
+    ## a worker keeps the raw set across the imputations it runs
+    if path not in _raw:
+        _raw.clear()
+        _raw[path] = load_raw(path)
+    raw = _raw[path]
+    ## impute-then-delete: the rows with an imputed outcome only informed the other columns
+    fits = fit_models(impute(raw, seed, iterations, chunk_rows)[raw['REASON'].to_numpy() != MISSING])
+    return OrderedDict((name, (res.params, res.cov_params, res.df_resid, res.nobs)) for name, res in fits.items())
+
+
+class PooledResult(object):
+    """Rubin's rules over m fits, with Barnard-Rubin degrees of freedom."""
+
+    def __init__(self, fits):
+        from scipy import stats
+        params = pd.concat([p for p, _, _, _ in fits], axis=1)
+        within = pd.concat([pd.Series(np.diag(cov), index=cov.index) for _, cov, _, _ in fits], axis=1)
+        m = len(fits)
+        self.m = m
+        self.nobs = fits[0][3]
+        self.params = params.mean(axis=1)
+        u = within.mean(axis=1)
+        b = params.var(axis=1, ddof=1) if m > 1 else pd.Series(0.0, index=params.index)
+        total = u + (1 + 1.0 / m) * b
+        self.bse = np.sqrt(total)
+        self.tvalues = self.params / self.bse
+        ## fraction of missing information; df_com is the complete-data residual df
+        gamma = (1 + 1.0 / m) * b / total
+        df_com = fits[0][2]
+        df_obs = (df_com + 1.0) / (df_com + 3.0) * df_com * (1 - gamma)
+        with np.errstate(divide='ignore'):
+            df_old = (m - 1) / gamma ** 2
+        self.df = 1.0 / (1.0 / df_old + 1.0 / df_obs)
+        self.fmi = gamma
+        self.pvalues = pd.Series(2 * stats.t.sf(np.abs(self.tvalues), self.df), index=self.params.index)
+
+    def summary_frame(self):
+        return pd.DataFrame(OrderedDict([('coef', self.params), ('std err', self.bse), ('t', self.tvalues),
+                                         ('P>|t|', self.pvalues), ('fmi', self.fmi)]))
+
+
+def multiply_impute(path, m=20, jobs=None, seed=12345, iterations=5, chunk_rows=1000000):
+    """Pooled DiD and FE results over `m` imputations of the -9 codes in the raw set at `path`."""
+    if m < 2:
+        ## Rubin's between-imputation variance needs at least two imputations
+        raise ValueError('need at least 2 imputations, got %d' % m)
+    seeds = np.random.SeedSequence(seed).spawn(m)
+    tasks = [(path, s, iterations, chunk_rows) for s in seeds]
+    if jobs == 1:
+        runs = [_imputation_task(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            runs = list(pool.map(_imputation_task, tasks))
+    return OrderedDict((name, PooledResult([run[name] for run in runs])) for name in MODELS)
+
+
+def pooled_table(results):
+    """Side-by-side coef / (std err) / p-value / fmi table, like panel_models.results_table."""
+    columns = OrderedDict()
+    rows = []
+    for res in results.values():
+        rows += [r for r in res.params.index if r not in rows]
+    for name, res in results.items():
+        columns[name + ' coef'] = res.params
+        columns[name + ' std err'] = res.bse
+        columns[name + ' P>|t|'] = res.pvalues
+        columns[name + ' fmi'] = res.fmi
+    table = pd.DataFrame(columns).reindex(rows)
+    for name, res in results.items():
+        table.loc['N', name + ' coef'] = res.nobs
+        table.loc['imputations', name + ' coef'] = res.m
+    return table
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='7M outpatient set with raw codes (.csv or .parquet)')
+    parser.add_argument('--m', type=int, default=20, help='number of imputations')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--iterations', type=int, default=5, help='chained-equation passes per imputation')
+    parser.add_argument('--chunk-rows', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=12345)
+    parser.add_argument('--out', default=pooled_path())
+    args = parser.parse_args()
+    if args.m < 2:
+        parser.error('--m must be at least 2 to pool with Rubin\'s rules')
+    table = pooled_table(multiply_impute(args.path, args.m, args.jobs, args.seed, args.iterations, args.chunk_rows))
+    table.to_csv(args.out)
+    with pd.option_context('display.width', 200, 'display.max_columns', 30):
+        print(table)
@@ -0,0 +1,147 @@
+"""
+Process-wide instrumentation: timings of the hot paths, memory and cache
+hit rates.
+
+Callers wrap a hot path in timed(kind, name) (section renders, dataset reads,
+figure builds, image encodes, plotly serialization); every observation goes
+to a per-(kind, name) count/total/max table for the debug sidebar and, when
+prometheus_client is installed, to a histogram. RSS and the data_store,
+figure_cache and image_assets counters are read at scrape time. The metrics are
+served on TEDS_METRICS_PORT and/or written to TEDS_METRICS_FILE (e.g. for the
+node_exporter textfile collector) after every rerun.
+
+This module imports nothing from the app so every other module can use it.
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import prometheus_client
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+except ImportError:
+    prometheus_client = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+METRICS_PORT = int(os.environ.get('TEDS_METRICS_PORT', 0))
+METRICS_FILE = os.environ.get('TEDS_METRICS_FILE')
+DEBUG = os.environ.get('TEDS_DEBUG', '') not in ('', '0')
+
+## histogram buckets, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+## modules whose cache_info() is exported, read only if already imported
+CACHES = ('data_store', 'figure_cache', 'image_assets')
+
+_timings = {}
+_lock = threading.Lock()
+_server_started = False
+
+
+def observe(kind, name, seconds):
+    with _lock:
+        record = _timings.setdefault((kind, name), [0, 0.0, 0.0])
+        record[0] += 1
+        record[1] += seconds
+        record[2] = max(record[2], seconds)
+    if _histogram is not None:
+        _histogram.labels(kind, name).observe(seconds)
+
+
+@contextmanager
+def timed(kind, name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(kind, name, time.perf_counter() - t0)
+
+
+def timings():
+    """[(kind, name, count, total seconds, max seconds)], slowest total first."""
+    with _lock:
+        rows = [key + tuple(record) for key, record in _timings.items()]
+    return sorted(rows, key=lambda row: -row[3])
+
+
+def cache_stats():
+    stats = {}
+    for module_name in CACHES:
+        module = sys.modules.get(module_name)
+        if module is not None:
+            stats[module_name] = module.cache_info()
+    return stats
+
+
+def rss_bytes():
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def object_summary(limit=20):
+    """Largest object types on the heap as (type, count, bytes); walks every object, seconds of work."""
+    from pympler import muppy, summary
+    rows = summary.summarize(muppy.get_objects())
+    return sorted(((str(t), n, size) for t, n, size in rows), key=lambda row: -row[2])[:limit]
+
+
+class _Collector(object):
+    ## gauges and counters read at scrape time
+
+    def collect(self):
+        rss = rss_bytes()
+        if rss is not None:
+            yield GaugeMetricFamily('teds_process_rss_bytes', 'Resident set size of the app process', value=rss)
+        counters = CounterMetricFamily('teds_cache_events', 'Cache lookups by outcome', labels=['cache', 'event'])
+        gauges = GaugeMetricFamily('teds_cache_size', 'Cache entries and bytes held', labels=['cache', 'unit'])
+        for cache, info in sorted(cache_stats().items()):
+            for key, value in sorted(info.items()):
+                if key in ('entries', 'bytes', 'budget_bytes'):
+                    gauges.add_metric([cache, key], value)
+                else:
+                    counters.add_metric([cache, key], value)
+        yield counters
+        yield gauges
+
+
+if prometheus_client is not None:
+    REGISTRY = prometheus_client.CollectorRegistry()
+    _histogram = prometheus_client.Histogram('teds_duration_seconds', 'Wall time of instrumented hot paths',
+                                             ['kind', 'name'], buckets=BUCKETS, registry=REGISTRY)
+    REGISTRY.register(_Collector())
+else:
+    REGISTRY = _histogram = None
+
+
+def exposition():
+    """The metrics in Prometheus text format (empty without prometheus_client)."""
+    if REGISTRY is None:
+        return ''
+    return prometheus_client.generate_latest(REGISTRY).decode()
+
+
+def publish():
+    """Start the metrics endpoint once per process and refresh the metrics file."""
+    global _server_started
+    if REGISTRY is None:
+        return
+    if METRICS_PORT and not _server_started:
+        with _lock:
+            if not _server_started:
+                _server_started = True
+                try:
+                    prometheus_client.start_http_server(METRICS_PORT, registry=REGISTRY)
+                except OSError:
+                    ## port taken, e.g. by a second app process; the file still works
+                    pass
+    if METRICS_FILE:
+        ## writes to a temporary file and renames it
+        prometheus_client.write_to_textfile(METRICS_FILE, REGISTRY)
@@ -0,0 +1,191 @@
+"""
+Regression models behind the Models and Results section, fit on the 1M-row
+outpatient regression set (outp_ols).
+
+The two-way fixed effects models absorb the state and year effects by
+iterative demeaning (pyhdfe's method of alternating projections) instead of
+expanding C(STFIPS) + C(DISYR) into dummy columns. By Frisch-Waugh-Lovell the
+slopes from the demeaned system equal the ones from the dummy formulation.
+"""
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import data_store
+import teds_pipeline
+
+
+OUTCOME = 'reason_coded'
+ENTITY, TIME = 'STFIPS', 'DISYR'
+
+## covariates of FE_v / FE_rt as written in cap_app.py
+FE_V = ['Treat', 'AGE', 'GENDER', 'VET', 'RACE', 'EMPLOY', 'EDUC', 'LIVARAG', 'METHUSE', 'NOPRIOR',
+        'SUB1', 'PRIMPAY', 'PSYPROB']
+FE_RT = [c for c in FE_V if c != 'RACE']
+
+## covariates of dd_v / dd_rt (and the clustered PanelOLS model, minus Post/DID)
+DD_V = ['Treat', 'Post', 'DID', 'AGE', 'GEN', 'VET', 'RACE', 'EMPLOY', 'EDUC', 'homeless', 'MAT',
+        'PRIOR', 'SUB1', 'PRIMPAY', 'PSY']
+DD_RT = [c for c in DD_V if c != 'RACE']
+
+PANEL_COLUMNS = sorted(set([OUTCOME, ENTITY, TIME] + FE_V + DD_V))
+
+## every column is a small integer code, so keep them compact in memory
+PANEL_DTYPES = dict((col, 'int8') for col in PANEL_COLUMNS)
+PANEL_DTYPES[TIME] = 'int16'
+
+## binary recodes of the raw TEDS-D codes used by the DiD models: column -> (raw column, code)
+RECODES = OrderedDict([(OUTCOME, ('REASON', 1)), ('GEN', ('GENDER', 1)), ('homeless', ('LIVARAG', 1)),
+                       ('MAT', ('METHUSE', 1)), ('PSY', ('PSYPROB', 1))])
+
+
+def panel_path():
+    """Location of the regression set, or None when it is not deployed with the app."""
+    candidates = [os.environ.get('TEDS_PANEL', '')]
+    candidates += [os.path.join(data_store.DATA_DIR, 'outp_ols' + ext) for ext in ('.parquet', '.csv')]
+    for path in candidates:
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+def derive_columns(raw):
+    """
+    The regression set's columns from raw, complete TEDS-D codes (STFIPS,
+    DISYR and teds_pipeline.REGRESSION_COLUMNS): the outcome, the DiD binary
+    recodes and the expansion dummies.
+    """
+    df = pd.DataFrame(dict((col, raw[col].to_numpy()) for col in [ENTITY, TIME] + FE_V if col in raw), index=raw.index)
+    for col, (source, code) in RECODES.items():
+        df[col] = (raw[source] == code).astype('int8')
+    df['PRIOR'] = (raw['NOPRIOR'] >= 1).astype('int8')
+    ## expansion year by STFIPS, 9999 for the states that never expanded
+    lookup = np.full(128, 9999)
+    lookup[list(teds_pipeline.IMP_YEAR)] = [int(y) for y in teds_pipeline.IMP_YEAR.values()]
+    imp = lookup[raw[ENTITY].to_numpy()]
+    year = raw[TIME].to_numpy()
+    df['Treat'] = (year >= imp).astype('int8')
+    df['Post'] = (year >= 2014).astype('int8')
+    df['DID'] = ((imp < 9999) & (year >= 2014)).astype('int8')
+    return df[PANEL_COLUMNS].astype(PANEL_DTYPES)
+
+
+def load_panel(path, columns=PANEL_COLUMNS):
+    if path.endswith('.parquet'):
+        df = pd.read_parquet(path, columns=list(columns))
+    else:
+        df = pd.read_csv(path, usecols=list(columns))
+    return df.astype(dict((col, PANEL_DTYPES[col]) for col in columns))
+
+
+class FEResult(object):
+    """Coefficients and classical inference for a model with absorbed effects."""
+
+    def __init__(self, names, params, cov, nobs, df_resid, ssr, tss_within):
+        from scipy import stats
+        self.params = pd.Series(params, index=names)
+        self.bse = pd.Series(np.sqrt(np.diag(cov)), index=names)
+        self.tvalues = self.params / self.bse
+        self.pvalues = pd.Series(2 * stats.t.sf(np.abs(self.tvalues), df_resid), index=names)
+        self.cov_params = pd.DataFrame(cov, index=names, columns=names)
+        self.nobs = nobs
+        self.df_resid = df_resid
+        self.ssr = ssr
+        self.rsquared_within = 1.0 - ssr / tss_within
+        k = len(names)
+        self.fvalue = ((tss_within - ssr) / k) / (ssr / df_resid)
+        self.f_pvalue = stats.f.sf(self.fvalue, k, df_resid)
+
+    def summary_frame(self):
+        return pd.DataFrame(OrderedDict([('coef', self.params), ('std err', self.bse),
+                                         ('t', self.tvalues), ('P>|t|', self.pvalues)]))
+
+
+def absorb(df, entity=ENTITY, time=TIME):
+    """pyhdfe algorithm that sweeps out the entity and time effects of `df`."""
+    import pyhdfe
+    ids = np.column_stack([df[entity].to_numpy(), df[time].to_numpy()])
+    ## keep singletons so the sample matches the dummy-variable OLS exactly
+    return pyhdfe.create(ids, drop_singletons=False)
+
+
+def absorbed_degrees(df, entity=ENTITY, time=TIME):
+    """
+    Rank of the intercept plus the entity and time dummies: their levels minus
+    the connected components of the entity-year graph. pyhdfe's own count
+    leaves out singleton groups even when they are kept.
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+    e_levels, e_code = np.unique(df[entity].to_numpy(), return_inverse=True)
+    t_levels, t_code = np.unique(df[time].to_numpy(), return_inverse=True)
+    n = len(e_levels) + len(t_levels)
+    graph = coo_matrix((np.ones(len(e_code)), (e_code, len(e_levels) + t_code)), shape=(n, n))
+    return n - connected_components(graph, directed=False)[0]
+
+
+def ols_within(y, X, names, absorbed_degrees):
+    """OLS on already demeaned data; `absorbed_degrees` is the rank of the swept dummies."""
+    xtx = X.T @ X
+    xty = X.T @ y
+    params = np.linalg.solve(xtx, xty)
+    resid = y - X @ params
+    nobs, k = X.shape
+    df_resid = nobs - k - absorbed_degrees
+    ssr = float(resid @ resid)
+    cov = np.linalg.inv(xtx) * (ssr / df_resid)
+    return FEResult(names, params, cov, nobs, df_resid, ssr, float(y @ y))
+
+
+def fit_twfe(df, covariates=FE_V, outcome=OUTCOME, algorithm=None):
+    """
+    Two-way fixed effects fit equivalent to
+    ols('outcome ~ covariates + C(DISYR) + C(STFIPS)'), without the dummies.
+
+    Pass an `algorithm` from absorb() to reuse it across specifications.
+    `fvalue` tests the covariates only; `fvalue_lsdv` is the F statsmodels
+    reports for the dummy formulation, which tests the dummies as well.
+    """
+    algorithm = algorithm or absorb(df)
+    matrix = np.empty((len(df), len(covariates) + 1))
+    matrix[:, 0] = df[outcome].to_numpy()
+    for j, col in enumerate(covariates):
+        matrix[:, j + 1] = df[col].to_numpy()
+    y = matrix[:, 0]
+    tss = float(((y - y.mean()) ** 2).sum())
+    demeaned = algorithm.residualize(matrix)
+    degrees = absorbed_degrees(df)
+    res = ols_within(demeaned[:, 0], demeaned[:, 1:], list(covariates), degrees)
+    ## the absorbed degrees include the intercept
+    df_model = len(covariates) + degrees - 1
+    res.fvalue_lsdv = ((tss - res.ssr) / df_model) / (res.ssr / res.df_resid)
+    return res
+
+
+def fit_fe_models(df):
+    """FE_v and FE_rt, sharing one absorption of the state and year effects."""
+    algorithm = absorb(df)
+    return OrderedDict([('FE_v', fit_twfe(df, FE_V, algorithm=algorithm)),
+                        ('FE_rt', fit_twfe(df, FE_RT, algorithm=algorithm))])
+
+
+def results_table(results):
+    """Side-by-side coef / (std err) / p-value table for several fits."""
+    columns = OrderedDict()
+    rows = []
+    for res in results.values():
+        rows += [r for r in res.params.index if r not in rows]
+    for name, res in results.items():
+        columns[name + ' coef'] = res.params
+        columns[name + ' std err'] = res.bse
+        columns[name + ' P>|t|'] = res.pvalues
+    table = pd.DataFrame(columns).reindex(rows)
+    for name, res in results.items():
+        table.loc['N', name + ' coef'] = res.nobs
+        ## "F" as statsmodels reports it for the dummy models, next to the F of the covariates alone
+        table.loc['F', name + ' coef'] = getattr(res, 'fvalue_lsdv', res.fvalue)
+        table.loc['F (within)', name + ' coef'] = res.fvalue
+        table.loc['R2 (within)', name + ' coef'] = res.rsquared_within
+    return table
@@ -0,0 +1,60 @@
+"""
+Report sections, imported and rendered only when a reader opens them.
+
+Each module exposes render(); its heavy dependencies (pandas, plotly, PIL,
+the model code) are imported at module level, so they are paid for the first
+time the section is opened rather than on every visit to the overview.
+TIMINGS keeps the cold import time and render times of each section for the
+process, and BUDGET_MS is the first-paint budget they are checked against.
+"""
+import importlib
+import os
+import sys
+import time
+from collections import OrderedDict
+
+import metrics
+
+
+SECTIONS = OrderedDict([
+    ('Exploratory Data Analysis', 'sections.eda'),
+    ('Trade Offs with Data', 'sections.tradeoffs'),
+    ('Methodology', 'sections.methodology'),
+    ('Models and Results', 'sections.models'),
+    ('Analysis', 'sections.analysis'),
+])
+
+## time-to-first-paint budget per section (import + first render), in ms
+BUDGET_MS = float(os.environ.get('TEDS_SECTION_BUDGET_MS', 1500))
+
+TIMINGS = {}
+_import_ms = {}
+
+
+def render(name):
+    """Import (once) and render a section; returns its timing record."""
+    module_name = SECTIONS[name]
+    t0 = time.perf_counter()
+    cold = module_name not in sys.modules
+    module = importlib.import_module(module_name)
+    t1 = time.perf_counter()
+    if cold:
+        _import_ms[name] = (t1 - t0) * 1e3
+        metrics.observe('section_import', name, t1 - t0)
+    module.render()
+    render_ms = (time.perf_counter() - t1) * 1e3
+    metrics.observe('section_render', name, render_ms / 1e3)
+    ## recorded only once a render succeeded, so every record has its render times
+    record = TIMINGS.get(name)
+    if record is None:
+        record = TIMINGS[name] = {'import_ms': _import_ms.get(name, 0.0), 'first_render_ms': render_ms, 'renders': 0}
+    record['last_render_ms'] = render_ms
+    record['renders'] += 1
+    return record
+
+
+def first_paint_ms(name):
+    record = TIMINGS.get(name)
+    if record is None:
+        return None
+    return record['import_ms'] + record['first_render_ms']
@@ -0,0 +1,74 @@
+import os
+
+import streamlit as st
+
+import suff_cube
+from sections.model_data import bootstrap_table, load_spec_cube
+
+
+def render():
+    st.header('Analysis')
+    st.markdown("""
+Based on the model specifications of FE models in regards to panel data like the TEDs-D dataset, it might be possible that the FE model is the more accurate model of the two. 
+However, in plotting the mean discharge rates across the years based on the implementation type, we know that the overall trend for the 2014 implementers was downward sloping 
+which is in contrast to the FE estimator for the FE model. 
+
+To further analyze this discrepancy, an alternative  implementation of the Two-way Fixed Effects model was used. Specifically, the standard errors were clustered. 
+By not clustering the standard errors for panel data, the resulting model might be prone to higher estimates for t-statistics , lower p values and narrow confidence 
+intervals. Hence, the very small p values for the DiD and Treat coefficients might be due to the unclustered standard errors. 
+""")
+
+    st.subheader('Alternative Implementation of FE Model')
+    FE= """
+w1=outp_ols.set_index(["STFIPS", "DISYR"])
+FE = PanelOLS(w1.reason_coded, w1[['Treat', 'AGE', 'GEN', 'VET', 'RACE', 'EMPLOY', 'EDUC', 'homeless', 'MAT', 'PRIOR', 'SUB1', 'PRIMPAY', 'PSY']],
+              entity_effects = True,
+              time_effects=True
+              )
+
+result = FE.fit(cov_type = 'clustered',
+             cluster_entity=True,
+             cluster_time=True
+             )
+
+#display(result.summary)
+"""
+
+
+    st.code(FE, language='python')
+    st.markdown("""
+The coefficients of the new FE model have the same values as the previous FE Models and only the p values changed for the coefficients. TREAT and PRIMPAY were not significant 
+while GEN (or being a man ) was only significant at 95% confidence level. Furthemore, the variable RACE was only significant at 90% CI. The rest of the coefficients 
+remained significant at 99% CI. 
+""")
+
+    cube = load_spec_cube()
+    if cube is not None:
+        st.markdown("With only about 45 states to cluster on, analytic clustered p values can still be too optimistic. The table below clusters by state "
+                    "only (CR1 standard errors, t with G - 1 degrees of freedom, unlike the state-and-year clustering of the PanelOLS fit above) and puts "
+                    "those p values next to a wild cluster bootstrap by state (9,999 Rademacher replications with the null imposed) for Treat in the FE "
+                    "model and for Treat and DID in the DiD model. The bootstrap interval holds the values of the coefficient that this test "
+                    "does not reject at the 5% level, so it need not be symmetric around the estimate.")
+        st.dataframe(bootstrap_table(suff_cube.cube_path(), os.path.getmtime(suff_cube.cube_path())))
+
+    st.header('Discussion')
+
+    st.markdown("""
+Overall, the positive direction of the ‘Treat’ variable might be due to the unclustered standard errors. In clustering the errors, the estimator remained  positive but the 
+p value indicated that it was not statistically significant and therefore, Medicaid expansion did not have a significant effect on treatment completions. This is more 
+intuitive than our previous findings from the non-clustered standard error results of the initial FE models given what we know from the plots for the Parallel Trend Assumption. 
+
+Also given that we mainly analyzed the FE models, the results are only generalizable to the states included in the 1m set which included outlier states
+like New York and California. Hence, in approaching this inquiry again, other sampling methods and econometric models should be considered to minimize the 
+loss of data from significant states and to properly account for all factors that play. 
+""")
+
+    st.header('Implication')
+    st.markdown("""
+While the expansion did not have any effect on treatment completions, we did observe that MAT participation was significantly and negatively correlated with treatment completions 
+across all the models. Given the range of the intercepts, the -.22 estimator for MAT is pretty large as well. This is an interesting observation given that MAT is touted as
+a modality that increases treatment retention  and thus perhaps conducive to successful treatment completions. 
+
+While this project was not able to illuminate the full extent of how medicaid expansion truly affected treatment completions, we did find some indication that states 
+might benefit more from MAT through continuous evaluation of its costs and potential health benfits. 
+""")
@@ -0,0 +1,40 @@
+"""
+Debug sidebar: hot-path timings, memory and cache hit rates of this process.
+
+Shown when TEDS_DEBUG is set or the page is opened with ?debug=1.
+"""
+import pandas as pd
+import streamlit as st
+
+import metrics
+
+
+def _mb(n):
+    return '%.1f MB' % (n / 1048576.0)
+
+
+def render_sidebar():
+    with st.sidebar.expander('Debug', expanded=True):
+        rss = metrics.rss_bytes()
+        if rss is not None:
+            st.caption('RSS: %s' % _mb(rss))
+
+        rows = metrics.timings()
+        if rows:
+            table = pd.DataFrame(rows, columns=['kind', 'name', 'count', 'total_s', 'max_s'])
+            table['mean_ms'] = table['total_s'] / table['count'] * 1e3
+            table['max_ms'] = table['max_s'] * 1e3
+            st.dataframe(table[['kind', 'name', 'count', 'mean_ms', 'max_ms']].round(1))
+
+        for cache, info in metrics.cache_stats().items():
+            hits = info['hits'] + info.get('disk_hits', 0)
+            lookups = hits + info['misses']
+            st.caption('%s: %d/%d hits (%.0f%%), %d entries%s' % (
+                cache, hits, lookups, 100.0 * hits / lookups if lookups else 0.0, info['entries'],
+                ', ' + _mb(info['bytes']) if 'bytes' in info else ''))
+
+        if st.button('Largest object types (Pympler, slow)'):
+            summary = pd.DataFrame(metrics.object_summary(), columns=['type', 'count', 'bytes'])
+            st.dataframe(summary)
+        if metrics.REGISTRY is not None and st.checkbox('Prometheus metrics'):
+            st.code(metrics.exposition(), language='text')
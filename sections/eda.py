@@ -0,0 +1,77 @@
+import streamlit as st
+
+import charts
+import filters
+from figure_cache import cached_figure
+from sections.shared import plotly_chart, sidebar_filters
+
+
+def render():
+    where = sidebar_filters()
+    st.header('Exploratory Data Analysis')
+    st.markdown("""
+In this section, we explore some of the features to get more insights on the treatment outcomes and demographic information of the
+ individuals represented in this dataset which we refer to as PiRs (Persons in Recovery) in this section . 
+
+**Discharge Rates:** Overall, the median annual discharge rates nationwide remained between 40% to 30% with the highest median level recorded 
+in 2009 at 43.5% which steadily declined in the following years. Furthermore, the spread for each year tended to be normal in distribution among the states. 
+
+""")
+    #https://github.com/corpuzn12/TED_d_app/blob/main/Datasets/dis_rate_agg.csv
+
+    fig_dis2 = cached_figure(charts.box_figure, ["dis_rate"], where=where, x="year", y="tmp_rate", title="Discharge Rate Between 2009 - 2019", color="#e884d6", hover="state")
+
+    plotly_chart(fig_dis2)
+
+    st.markdown("""
+**Medicaid as Primary Payment Source:** Since our analysis is focused on the effects of Medicaid on treatment outcomes, it might be relevant to know the 
+rate of which Medicaid was used as the primary payment source at admission. While the mean rate stayed between 0% to 20% ,
+there is a noticeable positive skew in the distribution for each year meaning that there are many states that recorded
+Medicaid utilization rates that are higher than the average. The degree of the positive skew peaked in 2009 at 52% then 
+decreased to around 35% to 28% in the following years until 2013. A similar pattern occurred between 2013 and 2019. 
+""")
+    fig_ptype = cached_figure(charts.box_figure, ["ptype_rate"], where=where, x="year", y="medicaid_use", title="Medicaid as Primary Payment Souce", color="#01661e", hover="state")
+
+    plotly_chart(fig_ptype)
+
+    st.markdown("""
+**Prior Treatment Attendance:** In terms of the percentage of treatment episodes that involved someone that had previous treatments before, the distribution 
+tended to be normal with a median rate fluctuating between 48% and 52% from 2009 to 2014. However the spread between 2015 and 2018 became concentrated between 30% to 60% as indicated by the shorter whiskers but the median rates stayed in the 49 % plus range. This change indicates that more states reported treatment 
+episodes that involved individuals with prior treatment history between 2015-2018. However, an almost normal spread with a slight positive skew was recorded
+for 2019 with the median rate of 39% which only means that while a lot more of the states reported rates in the 40s and above,there were also states 
+with lower percentage of folks with prior treatment episodes which was not the case in the previous 4 years.  
+""")
+    fig_prior = cached_figure(charts.box_figure, ["prior_rate"], where=where, x="year", y="discharge_rate", title="Prior Treatment Attendance", color="#b83209", hover="state")
+
+    plotly_chart(fig_prior)
+
+    st.markdown("""
+**Homelessness among Persons in Recovery:** Overall, homelessness seems to be a minor issue among the individuals in this dataset given that the 
+median percentage of homeless PiRs across the states hovered below 5% every year. While the range for each year’s spread oscillated throughout the years,
+the positive skew of these spreads steadily grew from 2015 onwards which indicated growing prevalence of homelessness among PiRs.  
+""")
+
+    fig_hom = cached_figure(charts.box_figure, ["homeless_rate"], where=where, x="year", y="homeless_rate", title="Homeless Rate per Year during Admission", color="#FF7F0E", hover="state")
+
+    plotly_chart(fig_hom)
+
+    st.markdown("""
+**Age:** About 40% of PiRs in this dataset were between 21 and 34 years old. Individuals between 35 to 49 years old trailed behind at 32%.
+""")
+    fig_age = cached_figure(charts.age_donut, ["age_dist"])
+    plotly_chart(fig_age)
+    if where != filters.NATIONAL:
+        st.caption('Age groups are only available nationally; this chart ignores the filters.')
+    st.markdown("""
+**Race:** White PiRs significantly outnumbered all of the other race categories each year with African Americans being the second largest group. 
+""")
+    fig_race = cached_figure(charts.count_histogram, ["race_agg"], where=where, x="DISYR", color="Race_Categ", title=" Race Categories Among PiRs ")
+    plotly_chart(fig_race)
+
+    st.markdown("""
+**Gender:** Men significantly outnumbered women in this dataset.  
+""")
+    fig_gender = cached_figure(charts.count_histogram, ["gender_agg"], where=where, x="DISYR", color="Gender_Type", title="Gender Distribution Among PiRs ",
+                               barmode="stack")
+
+    plotly_chart(fig_gender)
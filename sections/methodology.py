@@ -0,0 +1,123 @@
+import numpy as np
+import streamlit as st
+
+import filters
+import staggered_did
+import teds_pipeline
+from figure_cache import cached_figure
+from sections.model_data import load_spec_cube
+from sections.shared import plotly_chart, report_image, sidebar_filters
+
+
+def render():
+    where = sidebar_filters()
+    st.header('Methodology')
+
+    st.markdown("""
+Difference -in- Differences Model (DiD) estimates the treatment effects of an intervention (like a policy change like the Medicaid Expansion) by comparing the
+differences in observed outcomes between treatment and control groups, across pre-treatment and post-treatment periods. In this analysis, the treatment 
+group would be the states that adopted the expansion while the control group would be the states that deferred from implementing the expansion. 
+Also, the pre-treatment period are the years between 2009 and 2013 while the post-treatment period are the years from 2014 to 2019. 
+
+**The functional form for this model is pictured below.**
+""")
+    st.latex(r'''
+^{}Y_{discharge_status} = \beta_{0} + \beta_{1}Treat + \beta_{2}Post + \beta_{3}(Treat*Post)+ \beta_{4}Other Covariates + v_{ij} + u
+'''
+    )
+
+    st.latex(r'''
+\newline\beta_{0} = The\ mean\ value\ of\ the\ response\ variable\ when\ all\ of\ the\ predictor\ variables\ in\ the\ model\ are\ equal\ to\ zero
+\newline \beta_{1}Treat = Dummy\ variable\ that\ is\ equal\ to\ 1\ for\ states\ that\ adopted\ the\ expansion
+\newline \beta_{2}Post = Dummy\ variable\ that\ is\ equal\ to\ 1\ for\ the\ years\ during\ the\ treatment\ period\ (2014\ and\ onwards)
+\newline \beta_{3}(Treat*Post)= Interaction\ variable\ that\ represent\ the\ states \newline
+                             that\ implemented\ the\ expansion\ during\ the\ treatment\ period 
+'''
+    ) 
+
+    st.markdown("""
+The validity of the results of our DiD model is dependent on proving the Parallel Trend assumption. This assumption uses the control group as a 
+proxy for the counterfactual trend. Specifically, if both the treatment and control groups had parallel trends for a certain outcome and 
+a drastic deviation from the treatment group occurs during the treatment period, then this change can be attributed to the differential effect of the intervention. 
+
+To illustrate the Parallel Trend Assumption, the mean discharge status value for treatment and control states were plotted against discharge year with the 
+treatment states grouped according to its respective implementation year to account for the staggered adoption of the expansion. 
+""")
+    cells_7m = staggered_did.cells_from_aggregates(filters.select('dis_rate', where), filters.select('imp_yr_agg', where))
+    plotly_chart(cached_figure(staggered_did.aggregate_trend_figure, ["dis_rate", "imp_yr_agg"], where=where,
+                               title="Mean Discharge Status by Implementation Year (7M Set)"))
+
+
+    st.markdown("""
+The resulting graph shows no clear parallel trend among the states pre-intervention period and thus we cannot confidently say that a counterfactual scenario 
+is modeled by the control group which is an essential aspect of the DiD estimation. Given that we are comparing states of various sizes and different
+ideologies/cultures in terms of how substance use disorder is treated, it makes intuitive sense that proving the Parallel Trend assumption would be challenging. 
+While no immediate effect on average discharge status can be observed after 2014, a noticeable increase can be seen for the 2014 implementers around 2017
+onwards while the opposite is true for the 2016 group where a dip can be observed after 2016. 
+""")
+    #dis_rate_imp= pd.read_csv('C:/Users/16502/Documents/Capstone/dis_rate_imp.csv')
+    cube = load_spec_cube()
+    if cube is not None:
+        cells_1m = staggered_did.cells_from_cube(cube)
+        if where != filters.NATIONAL:
+            ## a few hundred state-year cells, a mask is cheaper than an index
+            labels = cells_1m['unit'].map(teds_pipeline.STATE_LABELS)
+            first, last = where.years or (cells_1m['year'].min(), cells_1m['year'].max())
+            cells_1m = cells_1m[(labels.isin(where.states) if where.states is not None else True)
+                                & cells_1m['year'].between(first, last)]
+        plotly_chart(staggered_did.trend_figure(staggered_did.cohort_means(cells_1m),
+                                                "Mean Discharge Status by Implementation Year (1M Set)"))
+    else:
+        report_image("para_dis_rate.jpg")
+
+    st.markdown("""
+Since the 1 million set would be used for the regressions, an analogous plot was generated using this dataset. The lines for each group are smoother 
+compared to the 7m set which means that we do lose a lot of context by using the 1m set. More importantly, the significant increase and decrease 
+in average discharge status for the 2014 and 2016 implementers respectively was not evident in the 1m set.
+
+
+Overall, the Medicaid expansion might not be as impactful - if not potentially mildly detrimental- to treatment outcomes based on these preliminary plots. 
+""")
+
+    st.markdown("""
+Because the expansion was adopted in waves, each implementation cohort can also be compared with the "Never" states separately, year by year, 
+using the year before its own expansion as the baseline. Averaging these group-time effects by years since expansion gives the event study below
+(95% intervals from resampling states).
+""")
+    try:
+        att_7m = staggered_did.GroupTimeATT(cells_7m)
+        att_overall = att_7m.overall()
+    except ValueError:
+        att_overall = None
+    ## a year window without a pre/post pair for any cohort leaves every effect undefined
+    if att_overall is None or np.isnan(att_overall['att']):
+        st.warning('The event study needs "Never" states, at least one expansion cohort and years on both sides of an expansion in the filtered data.')
+    else:
+        plotly_chart(staggered_did.event_study_figure(att_7m.event_study(), "Effect on Discharge Status by Years Since Expansion (7M Set)"))
+        st.write('Average post-expansion effect: %.3f (95%% CI %.3f to %.3f)' % (att_overall['att'], att_overall['ci_low'], att_overall['ci_high']))
+
+
+    st.subheader('Two-way Fixed Effects Model')
+    st.markdown("""
+If the Parallel Trend Assumption cannot be observed clearly, then there must be unobserved factors that are correlated with both treatment status and timing of the treatment.
+These unobserved heterogeneity or time invariant yet subject specific variation across the states and PiRs are factors that the Fixed-Effects Model accounts
+for by assuming that the  independent variables are constant.  Therefore, only the dependent variable changes in response to independent variables. 
+
+Since, the Parallel Trend Assumption cannot be clearly demonstrated in this dataset, the Two Way Fixed Effects was used as a secondary model. 
+
+**The functional form for this model is pictured below.**
+""")
+
+    st.latex(r'''
+y_{it} = \alpha + \beta * Treat_{it} + \gamma_t + \delta_i + \lambda_{it} + \epsilon_{it} \newline
+y_{it} = Treatment\ outome\ for\ a\ given\ state\ in\ a\ given\ year \newline
+\alpha = The\ mean\ value\ of\ the\ response\ variable\ \newline
+when\ all\ of\ the\ predictor\ variables\ in\ the\ model\ are\ equal\ to\ zero \newline
+\beta * Treat_{it} = Implementation\ status\ for\ a\ given\ state\ in\ a\ given\ year \newline
+\gamma_t = Time\ invarient\ variables\ eg. sex, race \newline
+\delta_i= entity\ effects\ \newline
+\lambda_{it}= Other\ covariates\ for\ each\ state \newline
+\epsilon_{it} = error\ term 
+
+'''
+    )
@@ -0,0 +1,43 @@
+"""
+Cached model results shared by the Methodology, Models and Analysis sections.
+
+Kept out of sections.shared so the EDA and trade-off sections do not import
+the model code when they are opened.
+"""
+import os
+
+import pandas as pd
+import streamlit as st
+
+import panel_models
+import suff_cube
+import wild_bootstrap
+
+
+@st.experimental_memo(show_spinner=True)
+def fit_fe_table(path, mtime):
+    ## mtime is only part of the cache key
+    panel = panel_models.load_panel(path)
+    return panel_models.results_table(panel_models.fit_fe_models(panel))
+
+
+@st.experimental_singleton
+def _load_cube(path, mtime):
+    return suff_cube.SuffCube.load(path)
+
+
+@st.experimental_memo(show_spinner=True)
+def bootstrap_table(path, mtime):
+    return wild_bootstrap.bootstrap_report(_load_cube(path, mtime), reps=9999)
+
+
+@st.experimental_memo
+def imputed_table(path, mtime):
+    return pd.read_csv(path, index_col=0)
+
+
+def load_spec_cube():
+    path = suff_cube.cube_path()
+    if not os.path.exists(path):
+        return None
+    return _load_cube(path, os.path.getmtime(path))
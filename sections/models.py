@@ -0,0 +1,125 @@
+import os
+
+import numpy as np
+import streamlit as st
+
+import imputation
+import panel_models
+import teds_pipeline
+from sections.model_data import fit_fe_table, imputed_table, load_spec_cube
+from sections.shared import report_image
+
+
+def render():
+    st.header('Models and Results')
+
+    st.markdown("""
+While we know that the Parallel Trend Assumption was not fulfilled in this case, it might still be interesting to compare the DID model with the FE models. 
+Also, a comparative model for each type was also generated without the “RACE” variable to check for robustness.
+<p> 
+**How to Analyze the Results:** Again, the F Statistic Score was assessed  in addition to the respective p values of each coefficient.  The ideal value 
+for F Statistic >10 while we want small p values.  
+""")
+
+    dd_v = """
+dd_v= ols(formula='reason_coded ~  Treat + Post + DID + AGE + GEN + VET + RACE +EMPLOY + EDUC + homeless + MAT + PRIOR + SUB1 + PRIMPAY+ PSY', data=outp_ols).fit()
+dd_v.summary()
+"""
+    st.code(dd_v, language='python')
+
+    dd_rt = """
+dd_rt= ols(formula='reason_coded ~  Treat + Post + DID + AGE + GEN + VET +EMPLOY + EDUC + homeless + MAT + PRIOR + SUB1 + PRIMPAY+ PSY', data=outp_ols).fit()
+dd_rt.summary()
+"""
+    st.code(dd_rt, language='python')
+
+    ##results dd
+    report_image("dd_modsf.jpg")
+
+    st.markdown("""
+**Analysis of DiD Models:** 
+In comparing the F Statistic scores between the 2 DiD Models, the model without the "RACE" variable had a marginally larger F Statistic score but both models had F Stats > 10.  
+The p values of the coefficients in both models were also statistically significant which means that there is less than 1% chance that these variables are not significant. 
+ 
+The **DID** variable had a coefficient of -0.037*** which means that being an adopter of medicaid expansion translated to -.037 less points towards a successful treatment completion. 
+Given that intercept is 0.574*** the DID's effect is very small but negative and statistically significant nonetheless. Despite of this, we were unable to conclude anything about 
+the differential effect of the medicaid expansion to treatment outcomes since the Parallel Trend assumption was not proven initially.
+ 
+In terms of the other covariates, age, education, being a man, race and being a veteran were positively correlated with treatment completions. However,  
+being employed, participating in Medication Assisted Therapy, payment type used, having prior treatment episodes, having psychological comorbidities, 
+being homeless and the type of substance being abused were all negatively correlated with treatment completions.
+""")
+
+    st.header('Two-Way Fixed Effects')
+
+    FE_v = """
+FE_v = ols(formula='reason_coded ~  Treat +C(DISYR) + C(STFIPS) + AGE + GENDER + VET + RACE +EMPLOY + EDUC + LIVARAG + METHUSE + NOPRIOR + SUB1 + PRIMPAY + PSYPROB ', data = outp_ols).fit()
+FE_v.summary()
+"""
+    st.code(FE_v, language='python')
+
+
+    FE_rt = """
+FE_rt = ols(formula='reason_coded ~  Treat +C(DISYR) + C(STFIPS) + AGE + GENDER + VET +EMPLOY + EDUC + LIVARAG + METHUSE + NOPRIOR + SUB1 + PRIMPAY + PSYPROB ', data = outp_ols).fit()
+FE_rt.summary()
+"""
+    st.code(FE_rt, language='python')
+
+    ##results 2W, fit live when the regression set is deployed with the app
+    panel_file = panel_models.panel_path()
+    if panel_file is not None:
+        st.dataframe(fit_fe_table(panel_file, os.path.getmtime(panel_file)))
+    else:
+        report_image("fe_modsf.jpg")
+
+    st.markdown("""
+**Analysis of FE Models:** 
+In comparing the F Statistic scores between the 2 FE Models, the model without the "RACE" variable had a marginally larger F Statistic score but both models again had 
+F stats that were > 10. The p values of the coefficients in both models were also statistically significant which means that there is less than 1% chance that these 
+variables are not significant. 
+    
+The **Treat** variable had a coefficient of 0.014*** which means that being an adopter of medicaid expansion translated to  **.014 more points towards 
+a successful treatment completion**. This is in contrast to the DiD Model that estimated a negative and partially larger coefficient compared to the FE Models. 
+
+    
+Furthermore, while both models had positive intercepts, the FE models had a coefficient of 0.468*** which was smaller than the  DID's estimated effect.
+
+In terms of the other covariates, age, education, being a man, race and being a veteran were positively correlated with treatment completions. However,  being employed, 
+participating in Medication Assisted Therapy, payment type used, having prior treatment episodes, having psychological comorbidities, being homeless and the 
+type of substance being abused were all negatively correlated with treatment completions.Still, the MAT coefficient had the largest degree of effect 
+at -0.220***which was similar to the DiD's estimation. 
+""")
+
+    pooled_file = imputation.pooled_path()
+    if os.path.exists(pooled_file):
+        st.subheader('Imputed Missing Values')
+        st.markdown("The models above drop every entry with a -9 (missing) code. Below they are refit on the full 7m set with the missing codes "
+                    "multiply imputed, pooled over the imputations with Rubin's rules; `fmi` is the fraction of missing information of each coefficient.")
+        st.dataframe(imputed_table(pooled_file, os.path.getmtime(pooled_file)))
+
+    cube = load_spec_cube()
+    if cube is not None:
+        st.subheader('Explore the Specifications')
+        st.markdown("The models below are solved from per state-year cross-product totals of the 1m set, so changing the covariates or "
+                    "excluding states refits them instantly without going back to the individual entries.")
+        spec_model = st.radio('Model', ['DiD', 'Two-way Fixed Effects'])
+        ## the DiD recodes and their raw codes are the same variable (GEN = GENDER == 1, ...), and Post is absorbed by the year effects
+        recodes = list(panel_models.RECODES) + ['PRIOR']
+        if spec_model == 'DiD':
+            excluded = [source for source, _ in panel_models.RECODES.values()] + ['NOPRIOR']
+        else:
+            excluded = recodes + ['Post']
+        spec_options = [c for c in cube.columns if c not in excluded]
+        spec_cols = st.multiselect('Covariates', spec_options, default=panel_models.DD_V if spec_model == 'DiD' else panel_models.FE_V)
+        state_names = dict((fips, teds_pipeline.STATE_LABELS.get(fips, str(fips)).strip()) for fips in sorted(set(cube.entity)))
+        spec_excl = st.multiselect('Exclude states', list(state_names), format_func=state_names.get)
+        spec_cluster = st.checkbox('Cluster standard errors by state')
+        if spec_cols:
+            try:
+                spec_res = cube.fit(spec_cols, effects=spec_model != 'DiD', exclude_states=spec_excl, cluster=spec_cluster)
+            except (ValueError, np.linalg.LinAlgError) as e:
+                st.warning('This specification cannot be estimated: %s.' % e)
+            else:
+                st.dataframe(spec_res.summary_frame())
+                st.write('N = %d, %s = %.2f, R2 = %.4f' % (spec_res.nobs, 'F' if spec_model == 'DiD' else 'F (within)',
+                                                             spec_res.fvalue, spec_res.rsquared_within))
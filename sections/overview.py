@@ -0,0 +1,66 @@
+"""
+Overview: the report title and introduction shown above every section, and the
+Overview page with the dataset description.
+"""
+import streamlit as st
+
+
+def render_header():
+    st.title('Effects of Medicaid  Expansion to Treatment Completions in SUD Outpatient Programs')
+    st.markdown("""
+As of January 2014, adults with incomes up to 138% of the Federal Poverty Level ($17,774 for an individual in 2021) became eligible 
+for Medicaid benefits under the Affordable Care Act’s (ACA) Medicaid expansion program. All but 12 states have adopted
+ the Medicaid expansion decision in their state.
+""")
+
+
+def render():
+    st.header('Overview')
+    st.markdown("""
+In investigating the causal relationship between Medicaid expansion and successful treatment completions for substance use disorder, 
+the Difference -in- Differences Model and Two-way Fixed Effects model were used to analyze a panel data of discharge events between 2009 and 2019. 
+""")
+
+    st.header('Dataset')
+
+    st.markdown("""
+TEDS-D dataset tracks the annual discharges (TEDS-D) from substance use treatment facilities. Publications between 2009 and 2019 were converged
+to create a master dataset containing 17 million entries and 62 features. This initial dataset was subsetted to only contain outpatient treatment 
+episodes which reduced the working dataframe to  around 7 million entries and 39 columns. The preprocessing methods are discussed in detail in this Jupyter Notebook.
+
+**Excluded Data** Five states were dropped due to inconsistent data submissions between 2009 and 2019. 
+These states were West Virginia, Oregon, Georgia, South Carolina and Washington.
+
+**Retained Features**  The final data frame consisted of both original features and some derived variables. The numeric encodings for
+ the original features used “-9” as code for missing values. 
+
+-  **'CASEID':** unique case identifier 
+-  **'STFIPS':** Numeric encoding for each State. State names were derived in 'STATE_NAME' for EDA
+- **'DISYR':** Discharge year 
+- **'AGE':** Numeric encoding for a certain age range. This variable  was encoded as general categorical age groups in the variable 'AGE_GRP' for EDA. 
+- **'GENDER':** Takes the value of 1 for Male, 2 for Female and -9  for missing values. Categorical equivalents are provided in 'Gender_Type' for EDA
+- **'RACE':** Numeric encoding for each race category.  This variable  was encoded as general categorical values in   'Race_Categ’ for EDA. 
+- **'EDUC':**  Numeric encoding for education level where high positive value indicates higher education level. 
+- **'EMPLOY':** Numeric encoding for employment status at admission where the least positive value (1) indicate full employment
+- **'DETNLF':** Numeric encoding for detailed not in-labor force category. 
+- **'PREG**': Takes the value of 1 for pregnant subjects, 2 otherwise. 
+- **'VET':**  Takes the value of 1 for veteran subjects, 2 otherwise. 
+- **'LIVARAG'** : Numeric encoding for living arrangements during admission where a value of 1 means Homeless. Binary and 
+       categorical equivalents were derived in 'Homeless' for EDA
+- **'PRIMINC':** Numeric encoding for source of income/support
+- **'SERVICES_D':** Numeric encoding for service type (outpatient, inpatient et) 
+- **'METHUSE':** Value of 1 indicates the use of Medication-assisted opioid therapy and 2 otherwise 
+- **'REASON':** Numeric encoding for Reason for discharge. Binary and categorical values were derived in ‘reason_coded’ where the 
+       value of 1 indicates successful treatment completions and 0 otherwise.  
+- **'LOS':** Numeric encoding for length of stay in treatment (in terms days)
+- **'NOPRIOR':** Binary encoding for previous substance use treatment episodes where a value of 1  indicates one or more prior treatment episodes and 0 otherwise. 
+- **'DSMCRIT':** Numeric encoding for primary diagnosis 
+- **'PSYPROB':** Value is 1 for  co-occurring mental and substance use disorders and 0 otherwise 
+- **'PRIMPAY':** Numeric encoding for primary payment source. Binary and categorical equivalent derived in  'Payment_Type' where 1 indicates the use  of Medicaid and 0 otherwise. 
+- **'Treat':** dummy variable that is equal to 1 for states that adopted the expansion  for a given year
+- **'Imp_Year':** The year when a state implemented the Medicaid expansion 
+- **'Post':** dummy variable that is equal to 1 for years post expansion (2014 onwards)
+- **'DID':** Interaction variable interaction variable which will represent the states that
+
+""")
+
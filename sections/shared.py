@@ -0,0 +1,37 @@
+import re
+
+import streamlit as st
+
+import filters
+import metrics
+
+
+def report_image(name):
+    """Images/<name> as its prebuilt app variant, which st.image sends without re-encoding."""
+    ## PIL is only loaded by the sections that show images
+    import image_assets
+    data, output_format = image_assets.app_image(name)
+    st.image(data, output_format=output_format)
+
+
+def plotly_chart(fig):
+    """st.plotly_chart, timed under the figure's title (serialization and send)."""
+    title = re.sub('<[^>]+>', '', fig.layout.title.text or '').strip() or (fig.data[0].type if fig.data else '')
+    with metrics.timed('plotly_chart', title):
+        st.plotly_chart(fig)
+
+
+def sidebar_filters():
+    """STATE_NAME, DISYR and Imp_Year filters in the sidebar; returns a filters.Selection."""
+    first, last = filters.year_range()
+    st.sidebar.subheader('Filters')
+    states = st.sidebar.multiselect('STATE_NAME', filters.state_options(), format_func=filters.display_name,
+                                    key='filter_states')
+    years = st.sidebar.slider('DISYR', first, last, (first, last), key='filter_years')
+    cohorts = st.sidebar.multiselect('Imp_Year', filters.COHORTS, key='filter_cohorts')
+    selection = filters.selection(states, years, cohorts, (first, last))
+    if selection.states == ():
+        st.sidebar.warning('No state matches these filters.')
+    elif selection != filters.NATIONAL:
+        st.sidebar.caption('Charts show the filtered states and years; the text describes the national data.')
+    return selection
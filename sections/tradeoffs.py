@@ -0,0 +1,35 @@
+import streamlit as st
+
+import charts
+from figure_cache import cached_figure
+from sections.shared import plotly_chart, sidebar_filters
+
+
+def render():
+    where = sidebar_filters()
+    st.header('Trade Offs with Data')
+    st.markdown("""
+The dataset with over 7 million entries is able to produce more insights in terms of the trends and distribution of some features of interest.
+However, the dataset coded missing values as -9 which will impact  the regression results. The most conservative approach was used in this case 
+and entries with -9 encodings were removed. This dramatically reduced the dataset to over 1 million entries. 
+
+In examining how the distribution of states based on the implementation year changed between the 7 million set and the 1 million set, the following 
+graphics were generated. In the full dataset, it can be observed that the states that eventually implemneted the expansion in 2014 were more represented 
+in the pre and post-treatment periods compared to the other groups. While the the "Never" group followed the seasonal pattern of the 2014 implementers
+but in lower volumes, the 2015 group steadily increased over time. Lastly, the 2016 group remained relatively constant. 
+
+""")
+
+    fig_s = cached_figure(charts.count_histogram, ["imp_yr_agg"], where=where, x="DISYR", color="Imp_Year",
+                          title=" Entries by Implementation Year for the 7M Set ", width=700, height=700)
+    plotly_chart(fig_s)
+
+    st.markdown("""
+In contrast, the 1 million set has more of a staggered pattern as opposed to the wave like patterb from the earlier plot. Also, the 2016 implementers
+seemed to gradually decrease in numbers as opposed to being constant. The likeness between the 1m and 7m sets may not be that consistent but 
+the overall seasonality and level of representation of the treatment and the control states are still reminiscent of the 7m set. Therefore, we can 
+proceed with some caution in using the 1m set in our regressions. 
+""")
+    fig_sm = cached_figure(charts.count_histogram, ["imp_yr_agg_1m"], where=where, x="DISYR", color="Imp_Year",
+                           title=" Entries by Implementation Year for the 1M Set ", width=700, height=700)
+    plotly_chart(fig_sm)
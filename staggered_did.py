@@ -0,0 +1,182 @@
+"""
+Group-time average treatment effects for the staggered Medicaid expansion
+(2014, 2015 and 2016 implementers against the 'Never' states), with
+event-study aggregation.
+
+Everything works on state-year cells (outcome sum and count per STFIPS and
+DISYR), never on rows: the cohort-year means behind every 2x2 comparison
+are one matrix product of a state-to-cohort indicator with the state-year
+sums, and the state cluster bootstrap reweights states in the same product for
+all (cohort, year) cells at once. Without covariates this is the
+Callaway-Sant'Anna estimator with the never-treated as controls and a
+varying base period before treatment.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import teds_pipeline
+
+
+NEVER = 'Never'
+
+
+def cells_from_aggregates(dis_rate, imp_yr_agg):
+    """
+    State-year cells of the 7M set from the published aggregates: the
+    completion rate (tmp_rate, in %) weighted by the discharge count.
+    """
+    counts = imp_yr_agg.rename(columns={'STATE_NAME': 'state', 'DISYR': 'year', 'Imp_Year': 'cohort', 'count': 'n'})
+    rates = dis_rate.astype({'state': str})
+    cells = rates.merge(counts.astype({'state': str, 'cohort': str}), on=['state', 'year'], how='inner')
+    return pd.DataFrame({'unit': cells['state'], 'cohort': cells['cohort'], 'year': cells['year'].astype(int),
+                         'y_sum': cells['tmp_rate'].astype(float) / 100.0 * cells['n'], 'n': cells['n'].astype(float)})
+
+
+def cells_from_cube(cube):
+    """State-year cells of the 1M regression set from the sufficient-statistics cube."""
+    return pd.DataFrame({'unit': cube.entity, 'cohort': [teds_pipeline.imp_year(int(f)) for f in cube.entity],
+                         'year': cube.time.astype(int), 'y_sum': cube.zz[:, 0, -1], 'n': cube.zz[:, 0, 0]})
+
+
+class _Panel(object):
+    ## dense state x year arrays plus the state -> cohort indicator
+
+    def __init__(self, cells):
+        self.units, u_code = np.unique(cells['unit'].to_numpy(), return_inverse=True)
+        self.years, t_code = np.unique(cells['year'].to_numpy(), return_inverse=True)
+        unit_cohort = cells.groupby('unit')['cohort'].first().reindex(self.units).to_numpy()
+        self.cohorts = np.array(sorted(set(unit_cohort), key=lambda c: (c == NEVER, c)))
+        self.y = np.zeros((len(self.units), len(self.years)))
+        self.n = np.zeros_like(self.y)
+        np.add.at(self.y, (u_code, t_code), cells['y_sum'].to_numpy(dtype=float))
+        np.add.at(self.n, (u_code, t_code), cells['n'].to_numpy(dtype=float))
+        self.onehot = (unit_cohort[:, None] == self.cohorts[None, :]).astype(float)
+
+    def cohort_means(self, unit_weights=None):
+        """(cohort x year) means, or (reps x cohort x year) for a (reps x unit) weight block."""
+        if unit_weights is None:
+            return (self.onehot.T @ self.y) / (self.onehot.T @ self.n)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (np.einsum('bs,sc,st->bct', unit_weights, self.onehot, self.y)
+                    / np.einsum('bs,sc,st->bct', unit_weights, self.onehot, self.n))
+
+
+def cohort_means(cells):
+    """Mean outcome per implementation cohort and year, for the parallel-trend plot."""
+    panel = _Panel(cells)
+    return pd.DataFrame(panel.cohort_means(), index=panel.cohorts, columns=panel.years)
+
+
+def _att_cells(means, cohort_years, years, never):
+    ## ATT(g, t) for every treated cohort g and year t at once; means is
+    ## (..., cohort, year). Post periods compare with g - 1, pre periods with t - 1.
+    t = years[None, :]
+    g = cohort_years[:, None]
+    base = np.where(t >= g, g - 1, t - 1)
+    base_idx = np.searchsorted(years, base)
+    valid = (base >= years[0]) & (base_idx < len(years)) & (years[np.clip(base_idx, 0, len(years) - 1)] == base)
+    base_idx = np.clip(base_idx, 0, len(years) - 1)
+    treated = means[..., :len(cohort_years), :]
+    ## the control is differenced against each cohort's own base period
+    control = np.broadcast_to(means[..., [never], :], treated.shape)
+    base_idx = np.broadcast_to(base_idx, treated.shape)
+    diff_t = treated - np.take_along_axis(treated, base_idx, axis=-1)
+    diff_c = control - np.take_along_axis(control, base_idx, axis=-1)
+    att = diff_t - diff_c
+    return np.where(valid, att, np.nan)
+
+
+class GroupTimeATT(object):
+    """
+    ATT(g, t) table, event-study and overall aggregation with state cluster
+    bootstrap standard errors and percentile intervals.
+    """
+
+    def __init__(self, cells, reps=999, seed=12345, alpha=0.05):
+        panel = _Panel(cells)
+        treated = [c for c in panel.cohorts if c != NEVER]
+        if NEVER not in panel.cohorts or not treated:
+            raise ValueError('need never-treated states and at least one treated cohort')
+        order = treated + [NEVER]
+        perm = [list(panel.cohorts).index(c) for c in order]
+        panel.onehot = panel.onehot[:, perm]
+        panel.cohorts = np.array(order)
+        self.panel = panel
+        self.cohorts = treated
+        self.cohort_years = np.array([int(c) for c in treated])
+        self.years = panel.years
+        never = len(treated)
+
+        ## cohort size weights for the aggregations: observations in the cohort
+        size = panel.onehot.T @ panel.n.sum(axis=1)
+        self._weights = size[:never]
+
+        self.att = _att_cells(panel.cohort_means(), self.cohort_years, self.years, never)
+        rng = np.random.default_rng(seed)
+        ## resample states with replacement: multinomial counts per replication
+        draws = rng.multinomial(len(panel.units), np.full(len(panel.units), 1.0 / len(panel.units)), size=reps)
+        self.att_boot = _att_cells(panel.cohort_means(draws.astype(float)), self.cohort_years, self.years, never)
+        self.alpha = alpha
+
+    def _summarize(self, est, boot, index, name):
+        ## cells without a base period are all-NaN in every replication
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            lo, hi = np.nanquantile(boot, [self.alpha / 2, 1 - self.alpha / 2], axis=0)
+            se = np.nanstd(boot, axis=0, ddof=1)
+        return pd.DataFrame({'att': est, 'se': se, 'ci_low': lo, 'ci_high': hi}, index=pd.Index(index, name=name))
+
+    def group_time(self):
+        idx = pd.MultiIndex.from_product([self.cohorts, self.years], names=['cohort', 'year'])
+        frame = self._summarize(self.att.ravel(), self.att_boot.reshape(len(self.att_boot), -1), idx, None)
+        frame.index = idx
+        return frame.dropna(subset=['att'])
+
+    def _aggregate(self, mask):
+        ## weighted average of ATT(g, t) over the cells selected by mask (cohort x year)
+        w = self._weights[:, None] * mask * ~np.isnan(self.att)
+        wb = self._weights[:, None] * mask * ~np.isnan(self.att_boot)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            est = np.nansum(self.att * w) / w.sum()
+            boot = np.nansum(self.att_boot * wb, axis=(-2, -1)) / wb.sum(axis=(-2, -1))
+        return est, boot
+
+    def event_study(self):
+        rel = self.years[None, :] - self.cohort_years[:, None]
+        events = np.arange(rel.min(), rel.max() + 1)
+        est, boot = zip(*[self._aggregate(rel == e) for e in events])
+        return self._summarize(np.array(est), np.column_stack(boot), events, 'event_time').dropna(subset=['att'])
+
+    def overall(self):
+        rel = self.years[None, :] - self.cohort_years[:, None]
+        est, boot = self._aggregate(rel >= 0)
+        return self._summarize(np.array([est]), boot[:, None], ['ATT'], None).iloc[0]
+
+
+def trend_figure(means, title):
+    import plotly.graph_objects as go
+    fig = go.Figure()
+    for cohort, row in means.iterrows():
+        fig.add_trace(go.Scatter(x=row.index, y=row.values, mode='lines+markers', name=str(cohort)))
+    fig.add_vline(x=2013.5, line_dash='dot', line_color='grey')
+    fig.update_layout(title_text='<b>%s</b>' % title, title_x=0.5, xaxis_title='Discharge Year',
+                      yaxis_title='Mean Discharge Status', legend_title_text='Imp_Year')
+    return fig
+
+
+def aggregate_trend_figure(dis_rate, imp_yr_agg, title):
+    return trend_figure(cohort_means(cells_from_aggregates(dis_rate, imp_yr_agg)), title)
+
+
+def event_study_figure(es, title):
+    import plotly.graph_objects as go
+    fig = go.Figure(go.Scatter(
+        x=es.index, y=es['att'], mode='markers+lines', name='ATT',
+        error_y=dict(type='data', symmetric=False, array=es['ci_high'] - es['att'], arrayminus=es['att'] - es['ci_low'])))
+    fig.add_hline(y=0, line_color='grey')
+    fig.add_vline(x=-0.5, line_dash='dot', line_color='grey')
+    fig.update_layout(title_text='<b>%s</b>' % title, title_x=0.5,
+                      xaxis_title='Years Relative to Expansion', yaxis_title='ATT on Discharge Status')
+    return fig
@@ -0,0 +1,198 @@
+"""
+Sufficient-statistics cube for the DiD and two-way FE regressions.
+
+For every (STFIPS, DISYR) cell the cube stores Z'Z with Z = [1, covariates, y],
+i.e. the cell's count, X'X, X'y and y'y. Any covariate subset, state/year
+filter, and the state/year dummy expansion (the dummies are constant inside a
+cell) can then be solved exactly from the cube without touching the rows.
+Clustered standard errors by state are exact as well, since the score of a
+cell only depends on its cross-products.
+
+    python suff_cube.py outp_ols.csv   # writes Datasets/suff_cube.npz
+"""
+import argparse
+import os
+
+import numpy as np
+
+import data_store
+import panel_models
+from panel_models import ENTITY, OUTCOME, TIME
+
+
+CUBE_COLUMNS = panel_models.DD_V + [c for c in panel_models.FE_V if c not in panel_models.DD_V]
+CUBE_FILE = 'suff_cube.npz'
+
+
+def cube_path():
+    return os.path.join(data_store.DATA_DIR, CUBE_FILE)
+
+
+def aliased_columns(ww, k, tol=1e-9):
+    """
+    Indices of the columns of a cross-product matrix that are (numerically) a
+    linear combination of the columns before them. The intercept and any
+    dummies (index k onwards) are taken first, so a covariate rather than a
+    dummy is reported when it is absorbed by the effects.
+    """
+    order = [0] + list(range(k, len(ww))) + list(range(1, k))
+    kept, aliased = [], []
+    for i in order:
+        if kept:
+            w = ww[np.ix_(kept, kept)]
+            c = ww[kept, i]
+            residual = ww[i, i] - c @ np.linalg.lstsq(w, c, rcond=None)[0]
+        else:
+            residual = ww[i, i]
+        if ww[i, i] <= 0 or residual <= tol * ww[i, i]:
+            aliased.append(i)
+        else:
+            kept.append(i)
+    return sorted(aliased)
+
+
+class SuffCube(object):
+
+    def __init__(self, columns, entity, time, zz):
+        self.columns = list(columns)
+        self.entity = np.asarray(entity)
+        self.time = np.asarray(time)
+        ## zz[g] is Z'Z of cell g; index 0 is the intercept, -1 the outcome
+        self.zz = np.asarray(zz, dtype=np.float64)
+
+    @classmethod
+    def from_frame(cls, df, columns=CUBE_COLUMNS, outcome=OUTCOME):
+        codes = df.groupby([ENTITY, TIME], sort=True).ngroup().to_numpy()
+        cells = df[[ENTITY, TIME]].drop_duplicates().sort_values([ENTITY, TIME])
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(cells) + 1))
+        arrays = [df[col].to_numpy() for col in list(columns) + [outcome]]
+        q = len(columns) + 2
+        zz = np.empty((len(cells), q, q))
+        for g in range(len(cells)):
+            rows = order[bounds[g]:bounds[g + 1]]
+            z = np.empty((len(rows), q))
+            z[:, 0] = 1.0
+            for j, values in enumerate(arrays):
+                z[:, j + 1] = values[rows]
+            zz[g] = z.T @ z
+        return cls(columns, cells[ENTITY].to_numpy(), cells[TIME].to_numpy(), zz)
+
+    def save(self, path):
+        np.savez_compressed(path, columns=np.array(self.columns), entity=self.entity, time=self.time, zz=self.zz)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f['columns'].tolist(), f['entity'], f['time'], f['zz'])
+
+    @property
+    def nobs(self):
+        return int(self.zz[:, 0, 0].sum())
+
+    def mask(self, states=None, years=None, exclude_states=None):
+        keep = np.ones(len(self.entity), dtype=bool)
+        if states is not None:
+            keep &= np.isin(self.entity, list(states))
+        if years is not None:
+            keep &= np.isin(self.time, list(years))
+        if exclude_states:
+            keep &= ~np.isin(self.entity, list(exclude_states))
+        return keep
+
+    def _system(self, covariates, keep, effects):
+        ## Expand each cell's [1, X] cross-products to [1, X, state dummies,
+        ## year dummies] with B_c, which copies the intercept row into the
+        ## cell's own dummy rows (first level of each is the reference).
+        idx = [0] + [1 + self.columns.index(c) for c in covariates]
+        zz = self.zz[keep]
+        m = zz[:, idx][:, :, idx]
+        my = zz[:, idx, -1]
+        k = len(idx)
+        if not effects:
+            b = np.broadcast_to(np.eye(k), (len(zz), k, k))
+        else:
+            states, s_code = np.unique(self.entity[keep], return_inverse=True)
+            years, t_code = np.unique(self.time[keep], return_inverse=True)
+            p = k + len(states) - 1 + len(years) - 1
+            b = np.zeros((len(zz), p, k))
+            b[:, np.arange(k), np.arange(k)] = 1.0
+            cells = np.arange(len(zz))
+            has_s = s_code > 0
+            b[cells[has_s], k + s_code[has_s] - 1, 0] = 1.0
+            has_t = t_code > 0
+            b[cells[has_t], k + len(states) - 1 + t_code[has_t] - 1, 0] = 1.0
+        ## optimize contracts pairwise; numpy's default three-operand loop is ~50x slower here
+        ww = np.einsum('gpi,gij,gqj->pq', b, m, b, optimize=True)
+        wy = np.einsum('gpi,gi->p', b, my)
+        return b, m, my, ww, wy, float(zz[:, -1, -1].sum()), int(round(zz[:, 0, 0].sum()))
+
+    def fit(self, covariates, effects=False, states=None, years=None, exclude_states=None, cluster=False):
+        """
+        OLS of the outcome on `covariates` over the selected cells, with
+        C(STFIPS) + C(DISYR) dummies when `effects` is set. `cluster` gives
+        CR1 standard errors clustered by state.
+
+        Raises ValueError naming the covariates that are collinear with the
+        intercept, the dummies or the covariates before them.
+        """
+        keep = self.mask(states, years, exclude_states)
+        if not keep.any():
+            raise ValueError('no cells left in the selection')
+        b, m, my, ww, wy, yty, nobs = self._system(covariates, keep, effects)
+        aliased = [covariates[i - 1] for i in aliased_columns(ww, len(covariates) + 1) if 0 < i <= len(covariates)]
+        if aliased:
+            raise ValueError('collinear with the other regressors%s: %s' % (
+                ' or the state/year effects' if effects else '', ', '.join(aliased)))
+        beta = np.linalg.solve(ww, wy)
+        ssr = yty - beta @ wy
+        p = len(beta)
+        df_resid = nobs - p
+        bread = np.linalg.inv(ww)
+        if cluster:
+            ## score of cell c: B_c (X'y_c - X'X_c B_c' beta), summed per state
+            scores = np.einsum('gpi,gi->gp', b, my - np.einsum('gij,gqj,q->gi', m, b, beta, optimize=True))
+            groups, g_code = np.unique(self.entity[keep], return_inverse=True)
+            per_group = np.zeros((len(groups), p))
+            np.add.at(per_group, g_code, scores)
+            n_g = len(groups)
+            meat = per_group.T @ per_group
+            cov = bread @ meat @ bread * (n_g / (n_g - 1.0)) * ((nobs - 1.0) / df_resid)
+        else:
+            cov = bread * (ssr / df_resid)
+
+        ## restricted model (intercept plus any absorbed effects) for the F test
+        _, _, _, ww0, wy0, _, _ = self._system([], keep, effects)
+        ssr0 = yty - wy0 @ np.linalg.solve(ww0, wy0)
+
+        k = len(covariates) + 1
+        if effects:
+            sel = np.arange(1, k)
+            names = list(covariates)
+        else:
+            sel = np.arange(k)
+            names = ['Intercept'] + list(covariates)
+        res = panel_models.FEResult(names, beta[sel], cov[np.ix_(sel, sel)], nobs, df_resid, ssr, ssr0)
+        if not effects:
+            ## FEResult's F counts every parameter, the intercept is not tested
+            res.fvalue = ((ssr0 - ssr) / (k - 1)) / (ssr / df_resid)
+            from scipy import stats
+            res.f_pvalue = stats.f.sf(res.fvalue, k - 1, df_resid)
+        return res
+
+
+def load_cube(path=None):
+    path = path or cube_path()
+    if not os.path.exists(path):
+        return None
+    return SuffCube.load(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('panel', help='outp_ols regression set (.csv or .parquet)')
+    parser.add_argument('--out', default=cube_path())
+    args = parser.parse_args()
+    cube = SuffCube.from_frame(panel_models.load_panel(args.panel))
+    cube.save(args.out)
+    print('%d cells, %d rows -> %s' % (len(cube.entity), cube.nobs, args.out))
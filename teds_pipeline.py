@@ -0,0 +1,272 @@
+"""
+Rebuilds the Datasets/ aggregates from the raw TEDS-D discharge files.
+
+Each raw CSV is split into newline-aligned byte ranges that are parsed in a
+process pool. Every range is streamed in row chunks, restricted to the
+outpatient episodes and the retained columns, and folded into per-(STFIPS,
+DISYR) partial aggregates (counts and rate numerators/denominators). The
+partials are summed in the parent, so memory stays bounded by
+jobs x chunksize rows no matter how many years are rebuilt.
+
+    python teds_pipeline.py tedsd_puf_2009.csv ... tedsd_puf_2019.csv --out Datasets
+"""
+import argparse
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+
+MISSING = -9
+
+## the 39 columns kept for the outpatient working set
+OUTPATIENT_COLUMNS = (
+    'CASEID', 'DISYR', 'STFIPS', 'AGE', 'GENDER', 'RACE', 'ETHNIC', 'MARSTAT', 'EDUC', 'EMPLOY',
+    'DETNLF', 'PREG', 'VET', 'LIVARAG', 'PRIMINC', 'ARRESTS', 'SERVICES', 'SERVICES_D', 'METHUSE',
+    'DAYWAIT', 'REASON', 'LOS', 'PSOURCE', 'DETCRIM', 'NOPRIOR', 'SUB1', 'ROUTE1', 'FREQ1', 'FRSTUSE1',
+    'SUB1_D', 'ALCDRUG', 'DSMCRIT', 'PSYPROB', 'HLTHINS', 'PRIMPAY', 'FREQ_ATND_SELF_HELP', 'IDU',
+    'REGION', 'DIVISION',
+)
+
+## SERVICES_D codes for ambulatory intensive / non-intensive outpatient
+OUTPATIENT_SERVICES = (6, 7)
+
+## West Virginia, Oregon, Georgia, South Carolina and Washington
+DROPPED_STATES = (54, 41, 13, 45, 53)
+
+## covariates that must be non-missing for a row to be in the 1M regression set
+REGRESSION_COLUMNS = ('REASON', 'AGE', 'GENDER', 'VET', 'RACE', 'EMPLOY', 'EDUC', 'LIVARAG',
+                      'METHUSE', 'NOPRIOR', 'SUB1', 'PRIMPAY', 'PSYPROB')
+
+## labels reproduce the ones in the published aggregates, stray spaces included
+STATE_LABELS = {
+    1: 'ALABAMA', 2: 'ALASKA', 4: 'ARIZONA', 5: 'ARKANSAS', 6: 'CALIFORNIA', 8: 'COLORADO',
+    9: 'CONNECTICUT', 10: 'DELAWARE', 11: 'DISTRICT OF COLUMBIA', 12: 'FLORIDA', 13: 'GEORGIA',
+    15: 'HAWAII ', 16: 'IDAHO', 17: 'ILLINOIS ', 18: 'INDIANA', 19: 'IOWA', 20: ' KANSAS',
+    21: 'KENTUCKY', 22: 'LOUISIANA', 23: 'MAINE', 24: 'MARYLAND', 25: 'MASSACHUSETTS',
+    26: 'MICHIGAN ', 27: 'MINNESOTA', 28: '28.0', 29: 'MISSOURI', 30: 'MONTANA', 31: 'NEBRASKA',
+    32: 'NEVADA', 33: 'NEW HAMPSHIRE ', 34: 'NEW JERSEY', 35: 'NEW MEXICO ', 36: 'NEW YORK',
+    37: 'NORTH CAROLINA', 38: 'NORTH DAKOTA', 39: 'OHIO', 40: 'OKLAHOMA', 41: 'OREGON',
+    42: 'PENNSYLVANIA', 44: 'RHODE ISLAND', 45: 'SOUTH CAROLINA', 46: 'SOUTH DAKOTA',
+    47: 'TENNESSEE', 48: 'TEXAS', 49: 'UTAH', 50: 'VERMONT', 51: 'VIRGINIA', 53: 'WASHINGTON',
+    54: 'WEST VIRGINIA', 55: 'WISCONSIN', 56: 'WYOMING', 72: 'PUERTO RICO',
+}
+
+## Medicaid expansion year by STFIPS; everything else is 'Never' within 2009-2019
+IMP_YEAR = dict(
+    [(fips, '2014') for fips in (4, 5, 6, 8, 9, 10, 11, 15, 17, 19, 21, 24, 25, 26, 27, 32, 33, 34,
+                                 35, 36, 38, 39, 41, 44, 50, 53, 54)]
+    + [(fips, '2015') for fips in (2, 18, 42)]
+    + [(fips, '2016') for fips in (22, 30)]
+)
+
+RACE_LABELS = {
+    1: ' ALASKAN NATIVE', 2: 'AMERICAN INDIAN', 3: 'ASIAN OR PACIFIC ISLANDER',
+    4: 'BLACK OR AFRICAN AMERICAN ', 5: 'WHITE', 6: 'ASIAN', 7: 'OTHER SINGLE RACE',
+    8: 'TWO OR MORE RACES', 9: 'ASIAN OR PACIFIC ISLANDER', MISSING: 'MISSING',
+}
+GENDER_LABELS = {1: 'Male', 2: 'Female', MISSING: '-9.0'}
+
+## AGE codes 1-12 folded into the groups of the age donut, in slice order
+AGE_GROUPS = (('20 and Under', (1, 2, 3)), ('35 to 49 yrs', (7, 8, 9)),
+              ('21 to 34 yrs', (4, 5, 6)), ('50 and Over', (10, 11, 12)))
+
+## (numerator, denominator) columns behind each rate table
+RATES = {
+    'dis_rate': ('completed', 'reason_n', 'tmp_rate'),
+    'ptype_rate': ('medicaid', 'primpay_n', 'medicaid_use'),
+    'prior_rate': ('prior', 'noprior_n', 'discharge_rate'),
+    'homeless_rate': ('homeless', 'livarag_n', 'homeless_rate'),
+}
+
+KEY = ['STFIPS', 'DISYR']
+
+
+def imp_year(fips):
+    return IMP_YEAR.get(fips, 'Never')
+
+
+class _RangeReader(io.RawIOBase):
+    ## file-like view over bytes [start, end) of a file
+
+    def __init__(self, path, start, end):
+        self._f = open(path, 'rb')
+        self._f.seek(start)
+        self._left = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        n = min(len(buf), self._left)
+        if n <= 0:
+            return 0
+        data = self._f.read(n)
+        buf[:len(data)] = data
+        self._left -= len(data)
+        return len(data)
+
+    def close(self):
+        self._f.close()
+        super(_RangeReader, self).close()
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        line = f.readline()
+    return [c.strip().strip('"').upper() for c in line.decode().split(',')], len(line)
+
+
+def byte_ranges(path, target_bytes):
+    """Split `path` (minus its header) into ranges that end on a newline."""
+    _, start = read_header(path)
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as f:
+        while start < size:
+            end = min(start + target_bytes, size)
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _value_counts(df, col):
+    counts = df.groupby(KEY + [col], sort=False).size()
+    counts.index.names = KEY + ['code']
+    return counts
+
+
+def aggregate_chunk(df):
+    """Fold one chunk of raw rows into mergeable per-(STFIPS, DISYR) partials."""
+    df = df[df['SERVICES_D'].isin(OUTPATIENT_SERVICES) & ~df['STFIPS'].isin(DROPPED_STATES)]
+    known = dict((col, df[col] != MISSING) for col in ('REASON', 'PRIMPAY', 'NOPRIOR', 'LIVARAG'))
+    complete = np.logical_and.reduce([(df[col] != MISSING).to_numpy() for col in REGRESSION_COLUMNS])
+    flags = pd.DataFrame({
+        'STFIPS': df['STFIPS'].to_numpy(),
+        'DISYR': df['DISYR'].to_numpy(),
+        'n': 1,
+        'complete': complete.astype(np.int64),
+        'completed': (df['REASON'] == 1).astype(np.int64).to_numpy(),
+        'reason_n': known['REASON'].astype(np.int64).to_numpy(),
+        'medicaid': (df['PRIMPAY'] == 4).astype(np.int64).to_numpy(),
+        'primpay_n': known['PRIMPAY'].astype(np.int64).to_numpy(),
+        'prior': (df['NOPRIOR'] >= 1).astype(np.int64).to_numpy(),
+        'noprior_n': known['NOPRIOR'].astype(np.int64).to_numpy(),
+        'homeless': (df['LIVARAG'] == 1).astype(np.int64).to_numpy(),
+        'livarag_n': known['LIVARAG'].astype(np.int64).to_numpy(),
+    })
+    return {
+        'totals': flags.groupby(KEY, sort=False).sum(),
+        'race': _value_counts(df, 'RACE'),
+        'gender': _value_counts(df, 'GENDER'),
+        'age': _value_counts(df, 'AGE'),
+    }
+
+
+def merge_partials(a, b):
+    """Sum two partial aggregates; both are plain counts so the merge is exact."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return dict((key, a[key].add(b[key], fill_value=0).astype(np.int64)) for key in a)
+
+
+def aggregate_range(path, start, end, chunksize=500000):
+    header, _ = read_header(path)
+    dtypes = dict((col, 'int64' if col == 'CASEID' else 'int32') for col in header if col in OUTPATIENT_COLUMNS)
+    partial = None
+    reader = pd.read_csv(io.BufferedReader(_RangeReader(path, start, end)), header=None, names=header,
+                         usecols=lambda col: col in OUTPATIENT_COLUMNS, dtype=dtypes, chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            partial = merge_partials(partial, aggregate_chunk(chunk))
+    return partial
+
+
+def _aggregate_task(args):
+    return aggregate_range(*args)
+
+
+def aggregate_files(paths, jobs=None, chunksize=500000, range_bytes=64 << 20):
+    tasks = [(path, start, end, chunksize) for path in paths for start, end in byte_ranges(path, range_bytes)]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return reduce(merge_partials, pool.map(_aggregate_task, tasks), None)
+
+
+def _state_frame(index):
+    fips = index.get_level_values('STFIPS')
+    return fips.map(STATE_LABELS.get), index.get_level_values('DISYR')
+
+
+def build_tables(partial):
+    """Turn merged partials into the frames cap_app.py reads, keyed like SCHEMAS."""
+    totals = partial['totals'].sort_index()
+    state, year = _state_frame(totals.index)
+    tables = {}
+    for name, (num, den, col) in RATES.items():
+        rate = pd.DataFrame({'state': state, 'year': year,
+                             col: 100.0 * totals[num].to_numpy() / totals[den].to_numpy()})
+        rate = rate[totals[den].to_numpy() > 0].reset_index(drop=True)
+        rate['row'] = np.arange(len(rate))
+        tables[name] = rate
+
+    for name, key, labels, label_col in (('race_agg', 'race', RACE_LABELS, 'Race_Categ'),
+                                         ('gender_agg', 'gender', GENDER_LABELS, 'Gender_Type')):
+        counts = partial[key]
+        state, year = _state_frame(counts.index)
+        frame = pd.DataFrame({'STATE_NAME': state, 'DISYR': year,
+                              label_col: counts.index.get_level_values('code').map(labels.get),
+                              'count': counts.to_numpy()})
+        frame = frame.groupby(['STATE_NAME', 'DISYR', label_col], sort=True, as_index=False)['count'].sum()
+        if name == 'race_agg':
+            frame.insert(0, 'Unnamed: 0', np.arange(len(frame)))
+        tables[name] = frame
+
+    for name, col in (('imp_yr_agg', 'n'), ('imp_yr_agg_1m', 'complete')):
+        fips = totals.index.get_level_values('STFIPS')
+        frame = pd.DataFrame({'DISYR': totals.index.get_level_values('DISYR'),
+                              'STATE_NAME': fips.map(STATE_LABELS.get),
+                              'Imp_Year': fips.map(imp_year),
+                              'count': totals[col].to_numpy()})
+        tables[name] = frame[frame['count'] > 0].sort_values(['DISYR', 'STATE_NAME']).reset_index(drop=True)
+
+    tables['age_dist'] = age_distribution(partial)
+    return tables
+
+
+def age_distribution(partial):
+    """Total discharges per age group, in the order of AGE_GROUPS."""
+    by_code = partial['age'].groupby(level='code').sum()
+    return pd.DataFrame({'AGE_GRP': [label for label, _ in AGE_GROUPS],
+                         'count': [int(by_code.reindex(list(codes), fill_value=0).sum()) for _, codes in AGE_GROUPS]})
+
+
+def write_tables(tables, out_dir):
+    import data_store
+    os.makedirs(out_dir, exist_ok=True)
+    for name, frame in tables.items():
+        frame.to_csv(os.path.join(out_dir, data_store.SCHEMAS[name][0]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='raw TEDS-D discharge CSVs')
+    parser.add_argument('--out', default='Datasets')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--chunksize', type=int, default=500000, help='rows parsed at a time per worker')
+    parser.add_argument('--range-mb', type=int, default=64, help='size of the byte range handed to each task')
+    parser.add_argument('--store', default=None, help='where to keep the partials for agg_store.py (default: OUT/agg_store.csv)')
+    args = parser.parse_args()
+    partial = aggregate_files(args.paths, args.jobs, args.chunksize, args.range_mb << 20)
+    write_tables(build_tables(partial), args.out)
+
+    import agg_store
+    agg_store.save_store(agg_store.partial_to_long(partial), args.store or os.path.join(args.out, agg_store.STORE_FILE))
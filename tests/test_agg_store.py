@@ -0,0 +1,34 @@
+"""Incremental ingestion keeps the years already in the aggregation store."""
+import pandas as pd
+import pytest
+
+import agg_store
+import benchmarks
+import data_store
+
+
+def _raw_year(tmp_path, raw, year):
+    path = str(tmp_path / ('raw_%d.csv' % year))
+    raw[raw['DISYR'] == year].assign(SERVICES_D=7).to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture(scope='module')
+def raw():
+    return benchmarks.synthetic_raw(30000, seed=11)
+
+
+def test_ingest_keeps_earlier_years(tmp_path, raw):
+    out = str(tmp_path / 'Datasets')
+    agg_store.ingest([_raw_year(tmp_path, raw, 2010), _raw_year(tmp_path, raw, 2011)], out, jobs=1, init=True)
+    agg_store.ingest([_raw_year(tmp_path, raw, 2012)], out, jobs=1)
+    for name in ('dis_rate', 'imp_yr_agg'):
+        table = pd.read_csv(data_store.dataset_path(name, out))
+        year = 'year' if 'year' in table else 'DISYR'
+        assert sorted(table[year].unique()) == [2010, 2011, 2012]
+
+
+def test_ingest_refuses_to_start_without_a_store(tmp_path, raw):
+    out = str(tmp_path / 'Datasets')
+    with pytest.raises(FileNotFoundError, match='init'):
+        agg_store.ingest([_raw_year(tmp_path, raw, 2012)], out, jobs=1)
@@ -0,0 +1,128 @@
+"""
+The fast estimators against the row-level fits they replace, on a synthetic
+panel: absorbed vs dummy two-way FE, the sufficient-statistics cube vs ols()
+(classical and state-clustered CR1), and the WCR bootstrap t* vs refitting
+the bootstrap sample row by row (and its interval vs the test it inverts).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import benchmarks
+import panel_models
+import suff_cube
+import wild_bootstrap
+
+
+NROWS = 20000
+
+
+@pytest.fixture(scope='module')
+def panel():
+    return benchmarks.synthetic_panel(NROWS, seed=7)
+
+
+@pytest.fixture(scope='module')
+def cube(panel):
+    return suff_cube.SuffCube.from_frame(panel)
+
+
+def _ols(panel, covariates, effects=False, **fit_kw):
+    from statsmodels.formula.api import ols
+    return ols(benchmarks.app_formula(covariates, effects), data=panel).fit(**fit_kw)
+
+
+def test_absorbed_fe_matches_dummy_ols(panel):
+    res = panel_models.fit_twfe(panel, panel_models.FE_V)
+    ref = _ols(panel, panel_models.FE_V, effects=True)
+    names = panel_models.FE_V
+    ## the demeaning is iterative, so agreement is up to pyhdfe's convergence tolerance
+    np.testing.assert_allclose(res.params[names], ref.params[names], rtol=1e-6, atol=1e-10)
+    np.testing.assert_allclose(res.bse[names], ref.bse[names], rtol=1e-6)
+    np.testing.assert_allclose(res.fvalue_lsdv, ref.fvalue, rtol=1e-6)
+    assert res.nobs == ref.nobs
+    assert res.df_resid == ref.df_resid
+
+
+def test_absorbed_fe_counts_singleton_groups(panel):
+    ## a state with a single row still uses up a degree of freedom
+    first = panel['STFIPS'].iloc[0]
+    single = panel[(panel['STFIPS'] != first) | (panel.index == panel.index[0])]
+    res = panel_models.fit_twfe(single, panel_models.FE_V)
+    ref = _ols(single, panel_models.FE_V, effects=True)
+    assert res.df_resid == ref.df_resid
+    np.testing.assert_allclose(res.fvalue_lsdv, ref.fvalue, rtol=1e-6)
+
+
+def test_cube_matches_ols(panel, cube):
+    res = cube.fit(panel_models.DD_V)
+    ref = _ols(panel, panel_models.DD_V)
+    names = ['Intercept'] + panel_models.DD_V
+    np.testing.assert_allclose(res.params[names], ref.params[names], rtol=1e-8, atol=1e-10)
+    np.testing.assert_allclose(res.bse[names], ref.bse[names], rtol=1e-8)
+    np.testing.assert_allclose(res.fvalue, ref.fvalue, rtol=1e-8)
+
+
+def test_cube_cluster_matches_ols_cr1(panel, cube):
+    covariates = wild_bootstrap.PANELOLS
+    res = cube.fit(covariates, effects=True, cluster=True)
+    ref = _ols(panel, covariates, effects=True, cov_type='cluster', cov_kwds={'groups': panel['STFIPS']})
+    np.testing.assert_allclose(res.params[covariates], ref.params[covariates], rtol=1e-8, atol=1e-10)
+    np.testing.assert_allclose(res.bse[covariates], ref.bse[covariates], rtol=1e-8)
+
+
+@pytest.mark.parametrize('covariates', [['GEN', 'GENDER'], ['MAT', 'METHUSE'], ['PSY', 'PSYPROB']])
+def test_cube_rejects_collinear_covariates(cube, covariates):
+    with pytest.raises(ValueError, match='collinear'):
+        cube.fit(['Treat'] + covariates)
+
+
+def test_cube_rejects_covariates_absorbed_by_effects(cube):
+    with pytest.raises(ValueError, match='Post'):
+        cube.fit(['Treat', 'Post'], effects=True)
+
+
+@pytest.mark.parametrize('effects,null', [(False, 0.0), (True, 0.0), (True, 0.02)])
+def test_wcr_t_matches_row_level_refit(panel, cube, effects, null):
+    import statsmodels.api as sm
+    covariates, test = (wild_bootstrap.PANELOLS if effects else panel_models.DD_V), 'Treat'
+    a, A, xtx, factor = wild_bootstrap.cluster_components(cube, covariates, test, effects, null=null)
+
+    columns = [panel[covariates].astype(float)]
+    if effects:
+        columns += [pd.get_dummies(panel[col], prefix=col, drop_first=True).astype(float) for col in ('STFIPS', 'DISYR')]
+    X = sm.add_constant(pd.concat(columns, axis=1)).to_numpy()
+    y = panel[panel_models.OUTCOME].to_numpy(dtype=float)
+    k = 1 + covariates.index(test)
+    ## bootstrap samples: the restricted fit (test coefficient = null) plus its residuals flipped per state
+    X0 = np.delete(X, k, axis=1)
+    offset = null * X[:, k]
+    fitted = offset + X0 @ np.linalg.lstsq(X0, y - offset, rcond=None)[0]
+    groups, g_code = np.unique(panel['STFIPS'].to_numpy(), return_inverse=True)
+
+    weights = wild_bootstrap.draw_weights(np.random.default_rng(3), (4, len(groups)))
+    t_star = wild_bootstrap.bootstrap_t(a, A, xtx, factor, weights)
+    for w, t in zip(weights, t_star):
+        refit = sm.OLS(fitted + w[g_code] * (y - fitted), X).fit(cov_type='cluster', cov_kwds={'groups': g_code})
+        np.testing.assert_allclose(t, (refit.params[k] - null) / refit.bse[k], rtol=1e-6)
+
+
+def test_wcr_interval_inverts_the_test(cube):
+    ## the p value at each end of the interval is about alpha: accepted just inside, rejected just outside
+    alpha, reps = 0.1, 999
+    table = wild_bootstrap.wild_cluster_bootstrap(cube, wild_bootstrap.PANELOLS, ('Treat',), True, reps=reps, alpha=alpha)
+    row = table.loc['Treat']
+    assert row['bootstrap ci low'] < row['coef'] < row['bootstrap ci high']
+    draws = wild_bootstrap.draw_weights(np.random.default_rng(5), (reps, len(np.unique(cube.entity))))
+    eps = 1e-2 * row['state CR1 se']
+
+    def p_value(b0):
+        a, A, xtx, factor = wild_bootstrap.cluster_components(cube, wild_bootstrap.PANELOLS, 'Treat', null=b0)
+        t_star = wild_bootstrap.bootstrap_t(a, A, xtx, factor, draws)
+        return np.mean(np.abs(t_star) >= abs(row['coef'] - b0) / row['state CR1 se'])
+
+    for end, outward in (('bootstrap ci low', -1), ('bootstrap ci high', 1)):
+        assert p_value(row[end] - outward * eps) > alpha - 0.03
+        assert p_value(row[end] + outward * eps) < alpha + 0.03
+    ## 0 is inside the interval exactly when the bootstrap does not reject it
+    assert (row['bootstrap ci low'] <= 0 <= row['bootstrap ci high']) == (row['bootstrap p'] >= alpha)